@@ -22,6 +22,16 @@ async function notarize(xid, cid, maxFee) {
     }
 }
 
+async function notarizeMany(updates, maxFee) {
+    try {
+        const response = await axios.post(`${config.archiver}/api/v1/notarize/batch`, { updates: updates, maxFee: maxFee });
+        return response.data;
+    }
+    catch (error) {
+        console.error(`notarizeMany error: ${error}`);
+    }
+}
+
 async function replaceByFee(txid, maxFee) {
     try {
         const response = await axios.post(`${config.archiver}/api/v1/replaceByFee`, { txid: txid, maxFee: maxFee });
@@ -32,9 +42,9 @@ async function replaceByFee(txid, maxFee) {
     }
 }
 
-async function certify(txid) {
+async function certify(txid, xid) {
     try {
-        const response = await axios.post(`${config.archiver}/api/v1/certify`, { txid: txid });
+        const response = await axios.post(`${config.archiver}/api/v1/certify`, { txid: txid, xid: xid });
         return response.data;
     }
     catch (error) {
@@ -42,6 +52,26 @@ async function certify(txid) {
     }
 }
 
+async function certifyMany(txids) {
+    try {
+        const response = await axios.post(`${config.archiver}/api/v1/certify/batch`, { txids: txids });
+        return response.data.results;
+    }
+    catch (error) {
+        console.error(`certifyMany error: ${error}`);
+    }
+}
+
+async function waitForCert(txid, timeout) {
+    try {
+        const response = await axios.post(`${config.archiver}/api/v1/certify/wait`, { txid: txid, timeout: timeout });
+        return response.data;
+    }
+    catch (error) {
+        console.error(`waitForCert error: ${error}`);
+    }
+}
+
 async function walletinfo() {
     try {
         const response = await axios.get(`${config.archiver}/api/v1/walletinfo`);
@@ -63,10 +93,11 @@ async function ready() {
 }
 
 // Function to add all changes, commit, and push
-async function commitChanges(event) {
+// Pass the folders the event touched to stage only those instead of the whole data tree
+async function commitChanges(event, paths) {
     try {
         const commitMessage = JSON.stringify(event);
-        const response = await axios.post(`${config.archiver}/api/v1/commit`, { message: commitMessage });
+        const response = await axios.post(`${config.archiver}/api/v1/commit`, { message: commitMessage, paths: paths });
         const commit = response.data;
 
         if (commit.error) {
@@ -126,6 +157,27 @@ async function pinAsset(xid) {
     }
 }
 
+// Pins many assets in one request, returns a map of xid to its pin result
+async function pinAssets(xids) {
+    try {
+        const paths = xids.map(xid => path.join(config.assets, xid));
+        const response = await axios.post(`${config.archiver}/api/v1/pins/batch`, { paths: paths }, { responseType: 'text' });
+        const pins = {};
+
+        for (const line of response.data.split('\n')) {
+            if (line) {
+                const ipfs = JSON.parse(line);
+                pins[path.basename(ipfs.path)] = ipfs;
+            }
+        }
+
+        return pins;
+    }
+    catch (error) {
+        console.error(`pinAssets error: ${error}`);
+    }
+}
+
 async function tweet(message) {
     try {
         const response = await axios.post(`${config.archiver}/api/v1/tweet`, { message: message });
@@ -139,13 +191,17 @@ async function tweet(message) {
 module.exports = {
     replaceByFee,
     certify,
+    certifyMany,
     commitChanges,
     getLogs,
     notarize,
+    notarizeMany,
     pinAsset,
+    pinAssets,
     pushChanges,
     ready,
     register,
     tweet,
+    waitForCert,
     walletinfo,
 };
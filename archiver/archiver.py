@@ -1,21 +1,27 @@
 import os
-import time
-import re
 import json
-import requests
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from git import Repo
 from git.exc import GitCommandError
-from ipfs import checkIpfs, getIpfs, IPFSError
-from datetime import datetime
-from threading import Lock
+from health import Checker, Health
+from pinjobs import pinQueue
+from pusher import PushScheduler
+from maintenance import RepoMaintenance
+from mirror import DataMirror
+from committer import GroupCommitter, CommitError, RepoLock
+from eventlog import eventLog
+from walletinfo import walletInfo
+from chainevents import chainEvents
+from datetime import datetime, timedelta
+from serving import Bulkhead, serve
 
 import authorizer
+import ipfs
+import pricing
 import twitter
 
 app = Flask(__name__)
-lock = Lock()
 
 try:
     Repo.init('data')
@@ -23,53 +29,115 @@ except GitCommandError as error:
     print(f"git error {str(error)}")
 
 repo = Repo('data')
+lock = RepoLock(repo)
+
+# Index what is already in the repo before the committer starts appending to it
+with lock:
+    eventLog.backfill(repo)
+
+committer = GroupCommitter(repo, lock)
+committer.listeners.append(eventLog.append)
+pusher = PushScheduler(repo)
+committer.listeners.append(pusher.schedule)
+maintenance = RepoMaintenance(repo, lock, committer)
+mirror = DataMirror(repo, committer)
 
 def exchange_rate():
-    rates = requests.get('https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd').json()
-    btc_usd_rate = rates['bitcoin']['usd']
-    return btc_usd_rate
+    return pricing.rates.get()
 
-@app.route('/api/v1/ready', methods=['GET'])
-def ready():
-    auth = authorizer.Authorizer()
-    addr = auth.getAddress()
+# Routes are grouped by the backend they wait on, see Bulkhead. /commit has
+# none: the committer already serializes writes, and capping the requests in
+# flight would cap the size of a group commit too
+ipfsRoutes = Bulkhead('ipfs', 4, 600)
+bitcoinRoutes = Bulkhead('bitcoin', 6, 60)
+waitRoutes = Bulkhead('wait', 8, 75)
+twitterRoutes = Bulkhead('twitter', 2, 30)
 
-    # Check if checkIpfs() returns True and getAddress() returns a non-empty string
-    ready = checkIpfs() and bool(addr.strip())
+pricing.rates.prefetch()
+chainEvents.start()
 
-    return jsonify({'ready': ready})
+# Background checkers keep this current so probes never touch the dependencies
+health = Health()
+health.add('ipfs', ipfs.pool)
+health.add('bitcoin', Checker('bitcoin', lambda: authorizer.getAuthorizer().getWalletinfo()))
+health.add('git', Checker('git', lambda: repo.git.rev_parse('--git-dir')))
+
+@app.route('/api/v1/ready', methods=['GET'])
+def ready():
+    return jsonify(health.status())
 
 @app.route('/api/v1/pin/<path:subfolder>', methods=['GET'])
+@ipfsRoutes
 def pin(subfolder):
-    try:
-        if not subfolder:
-            print("Failed to pin data: No path provided")
-            return jsonify({'error': 'No path provided'}), 400
-
-        if checkIpfs():
-            start = time.time()
-            ipfs = getIpfs()
-            elapsed = time.time() - start
-            #print(f"> getIpfs took {elapsed} seconds")
-
-            start = time.time()
-            pins = ipfs.add(subfolder, recursive=True, pin=True, pattern="**")
-            elapsed = time.time() - start
-            #print(f"> ipfs.add took {elapsed} seconds for {len(pins)} items")
-            cid = pins[-1]['Hash']
-            cids = [{ 'name': pin['Name'], 'cid': pin['Hash']} for pin in pins]
-        else:
-            print("IPFS not available")
-            return jsonify({'error': 'IPFS not available'}), 500
-    except IPFSError as error:
-        print(f"Failed to pin data {subfolder}: {str(error)}")
-        return jsonify({'error': f"Failed to pin data: {str(error)}"}), 500
-    except Exception as error:
-        print(f"An unexpected error occurred: {str(error)}")
-        return jsonify({'error': f"An unexpected error occurred: {str(error)}"}), 500
+    if not subfolder:
+        print("Failed to pin data: No path provided")
+        return jsonify({'error': 'No path provided'}), 400
+
+    if request.args.get('stream'):
+        # One JSON line per file and folder as it is pinned, then one with the root CID
+        job = pinQueue.submit(subfolder, stream=True)
+
+        def results():
+            for name, cid in job.entries():
+                yield json.dumps({'name': name, 'cid': cid}) + '\n'
+
+            if job.error:
+                yield json.dumps({'path': subfolder, 'error': job.error}) + '\n'
+            else:
+                yield json.dumps({'path': subfolder, 'cid': job.cid}) + '\n'
+
+        response = Response(results(), mimetype='application/x-ndjson')
+        # A client that goes away mustn't leave the pin waiting on a full stream
+        response.call_on_close(job.close)
+        return response
+
+    job = pinQueue.submit(subfolder)
+    job.done.wait()
+
+    if job.error:
+        return jsonify({'error': job.error}), 500
+
+    return jsonify({'path': subfolder, 'cid': job.cid, 'cids': job.cids})
+
+@app.route('/api/v1/pins', methods=['POST'])
+@ipfsRoutes
+def submitPin():
+    data = request.get_json()
+
+    if not data or not data.get('path'):
+        return jsonify({'error': 'No path provided'}), 400
+
+    job = pinQueue.submit(data['path'])
+    return jsonify(job.status()), 202
+
+@app.route('/api/v1/pins/batch', methods=['POST'])
+@ipfsRoutes
+def pinBatch():
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('paths'), list):
+        return jsonify({'error': 'No paths provided'}), 400
+
+    # Jobs run on the shared worker pool; results stream back one JSON line per path as they finish
+    jobs = [pinQueue.submit(path) for path in dict.fromkeys(data['paths'])]
+
+    def results():
+        for job in pinQueue.watch(jobs):
+            if job.error:
+                yield json.dumps({'path': job.path, 'error': job.error}) + '\n'
+            else:
+                yield json.dumps({'path': job.path, 'cid': job.cid, 'cids': job.cids}) + '\n'
+
+    return Response(results(), mimetype='application/x-ndjson')
+
+@app.route('/api/v1/pins/<job_id>', methods=['GET'])
+def pinStatus(job_id):
+    job = pinQueue.get(job_id)
 
-    print(f"pinned {subfolder} to {cid}")
-    return jsonify({'path': subfolder, 'cid': cid, 'cids': cids})
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    return jsonify(job.status())
 
 @app.route('/api/v1/commit', methods=['POST'])
 def commit():
@@ -79,68 +147,66 @@ def commit():
         return jsonify({'error': 'No message provided'}), 400
 
     message = data['message']
+    paths = data.get('paths')
+
+    if paths is not None and not isinstance(paths, list):
+        return jsonify({'error': 'paths must be a list'}), 400
 
-    with lock:
-        try:
-            repo.git.add('--all')
-            repo.git.commit('-m', message)
-            githash = repo.git.rev_parse('HEAD')
-            print(f'git commit successful: "{message}"')
-        except GitCommandError as error:
-            print(f'Failed to commit changes: {str(error)}')
-            return jsonify({'error': f'Failed to commit changes: {str(error)}'}), 500
+    try:
+        githash = committer.commit(message, paths)
+    except CommitError as error:
+        return jsonify({'error': f'Failed to commit changes: {str(error)}'}), 500
 
     return jsonify({'ok': 1, 'githash': githash})
 
 @app.route('/api/v1/push', methods=['GET'])
 def push():
-    with lock:
-        try:
-            repo.git.push()
-            print('git push successful')
-        except GitCommandError as error:
-            print(f'Failed to push changes: {str(error)}')
-            return jsonify({'error': f'Failed to push changes: {str(error)}'}), 500
-
+    # The push itself runs in the background, see /api/v1/push/status
+    pusher.pushNow()
     return jsonify({'ok': 1})
 
+@app.route('/api/v1/push/status', methods=['GET'])
+def pushStatus():
+    return jsonify(pusher.status())
+
+@app.route('/api/v1/maintenance', methods=['GET'])
+def maintenanceStatus():
+    return jsonify(maintenance.status())
+
+@app.route('/api/v1/mirror', methods=['GET'])
+def mirrorSnapshot():
+    # Root CID of the IPFS mirror for githash, or for the latest mirrored commit
+    snapshot = mirror.snapshot(request.args.get('githash'))
+
+    if not snapshot:
+        return jsonify({'error': 'No snapshot'}), 404
+
+    return jsonify(snapshot)
+
 @app.route('/api/v1/logs', methods=['GET'])
 def logs():
-    with lock:
-        try:
-            raw_logs = repo.git.log('--since="1 week ago"', '--pretty=format:"%h - %ad - %s"').split('\n')
-        except GitCommandError as error:
-            print(f'Failed to fetch logs: {str(error)}')
-            return jsonify({'error': f'Failed to fetch logs: {str(error)}'}), 500
-
-    parsed_logs = []
-    for log in raw_logs:
-        match = re.match(r'"(\w+) - (.+?) - (.+)"', log)
-        if match:
-            hash_value, date_str, json_str = match.groups()
-
-            try:
-                # Parse the date to datetime object
-                date_obj = datetime.strptime(date_str, '%a %b %d %H:%M:%S %Y %z')
-                # Convert the datetime object to ISO format
-                iso_date = date_obj.isoformat()
-            except ValueError:
-                print(f"Failed to parse date: {date_str}")
-                continue
-
-            try:
-                json_obj = json.loads(json_str)
-            except json.JSONDecodeError:
-                print(f"Failed to decode JSON: {json_str}")
-                continue
-
-            json_obj["hash"] = hash_value
-            json_obj["date"] = iso_date
-            parsed_logs.append(json_obj)
-
-    return jsonify({'logs': parsed_logs})
+    # Served from the event index, so it never waits on git or the commit lock
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else datetime.now() - timedelta(weeks=1)
+        cursor = request.args.get('cursor', type=int)
+        limit = request.args.get('limit', type=int)
+    except ValueError as error:
+        return jsonify({'error': f'Invalid query: {str(error)}'}), 400
+
+    try:
+        parsed_logs, next = eventLog.query(since.timestamp(), cursor, limit,
+                                           type=request.args.get('type'),
+                                           agent=request.args.get('agent'),
+                                           asset=request.args.get('asset'))
+    except Exception as error:
+        print(f'Failed to fetch logs: {str(error)}')
+        return jsonify({'error': f'Failed to fetch logs: {str(error)}'}), 500
+
+    return jsonify({'logs': parsed_logs, 'next': next})
 
 @app.route('/api/v1/register', methods=['POST'])
+@bitcoinRoutes.spends
 def register():
     data = request.get_json()
 
@@ -151,9 +217,10 @@ def register():
         return jsonify({'error': 'No cid provided'}), 400
 
     try:
-        auth = authorizer.Authorizer()
-        auth.register = True
-        txid = auth.notarize(data['xid'], data['cid'], 0)
+        auth = authorizer.getAuthorizer()
+        with auth.spending(data['xid']):
+            txid = auth.notarize(data['xid'], data['cid'], 0, register=True)
+        chainEvents.watch(txid)
     except Exception as e:
         print(f"register exception: {e}")
         return jsonify({'error': str(e)}), 500
@@ -161,6 +228,7 @@ def register():
     return jsonify({'txid': txid})
 
 @app.route('/api/v1/notarize', methods=['POST'])
+@bitcoinRoutes.spends
 def notarize():
     data = request.get_json()
 
@@ -180,15 +248,51 @@ def notarize():
     print(f"notarize: rate {btc_usd_rate} and ${maxFee} limit {limit}")
 
     try:
-        auth = authorizer.Authorizer()
-        txid = auth.notarize(data['xid'], data['cid'], limit)
+        auth = authorizer.getAuthorizer()
+        with auth.spending(data['xid']):
+            txid = auth.notarize(data['xid'], data['cid'], limit)
+        chainEvents.watch(txid)
     except Exception as e:
         print(f"notarize exception: {e}")
         return jsonify({'error': str(e)}), 500
 
     return jsonify({'txid': txid})
 
+@app.route('/api/v1/notarize/batch', methods=['POST'])
+@bitcoinRoutes.spends
+def notarizeBatch():
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('updates'), list):
+        return jsonify({'error': 'No updates provided'}), 400
+
+    if 'maxFee' not in data:
+        return jsonify({'error': 'No maxFee provided'}), 400
+
+    try:
+        updates = [(update['xid'], update['cid']) for update in data['updates']]
+    except (KeyError, TypeError):
+        return jsonify({'error': 'Each update needs an xid and a cid'}), 400
+
+    maxFee = int(data['maxFee'])
+    btc_usd_rate = exchange_rate()
+    limit = maxFee/btc_usd_rate
+
+    print(f"notarize batch: rate {btc_usd_rate} and ${maxFee} limit {limit}")
+
+    try:
+        auth = authorizer.getAuthorizer()
+        # Spends no auth outputs, so only the coin selector guards it
+        result = auth.notarizeBatch(updates, limit)
+        chainEvents.watch(result and result['txid'])
+    except Exception as e:
+        print(f"notarize batch exception: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(result or {'txid': None})
+
 @app.route('/api/v1/certify', methods=['POST'])
+@bitcoinRoutes
 def certify():
     data = request.get_json()
 
@@ -196,15 +300,55 @@ def certify():
         return jsonify({'error': 'No txid provided'}), 400
 
     try:
-        auth = authorizer.Authorizer()
-        cert = auth.certify(data['txid'])
+        auth = authorizer.getAuthorizer()
+        # xid picks the cert out of a batch commitment
+        cert = auth.certify(data['txid'], data.get('xid'))
+    except authorizer.NotInBatchError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"certify exception: {e}")
         return jsonify({'error': str(e)}), 500
 
     return jsonify(cert)
 
+@app.route('/api/v1/certify/batch', methods=['POST'])
+@bitcoinRoutes
+def certifyBatch():
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('txids'), list):
+        return jsonify({'error': 'No txids provided'}), 400
+
+    try:
+        auth = authorizer.getAuthorizer()
+        results = auth.certifyMany(data['txids'])
+    except Exception as e:
+        print(f"certify exception: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'results': results})
+
+@app.route('/api/v1/certify/wait', methods=['POST'])
+@waitRoutes
+def certifyWait():
+    data = request.get_json()
+
+    if not data or 'txid' not in data:
+        return jsonify({'error': 'No txid provided'}), 400
+
+    # Long-poll: answers as soon as the block with txid arrives, or with a pending status on timeout
+    timeout = min(float(data.get('timeout', 30)), 60)
+
+    try:
+        result = chainEvents.wait(data['txid'], timeout)
+    except Exception as e:
+        print(f"certify exception: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(result)
+
 @app.route('/api/v1/replaceByFee', methods=['POST'])
+@bitcoinRoutes.spends
 def replaceByFee():
     data = request.get_json()
 
@@ -221,8 +365,11 @@ def replaceByFee():
     print(f"replaceByFee: rate {btc_usd_rate} and ${maxFee} fee {fee}")
 
     try:
-        auth = authorizer.Authorizer()
-        txid = auth.replaceByFee(data['txid'], fee)
+        auth = authorizer.getAuthorizer()
+        # Keyed like /notarize, so a bump and a new cid for the same xid can't cross
+        with auth.spending(auth.xidOf(data['txid'])):
+            txid = auth.replaceByFee(data['txid'], fee)
+        chainEvents.watch(txid)
     except Exception as e:
         print(f"replaceByFee exception: {e}")
         return jsonify({'error': str(e)}), 500
@@ -230,50 +377,18 @@ def replaceByFee():
     return jsonify({'txid': txid})
 
 @app.route('/api/v1/walletinfo', methods=['GET'])
+@bitcoinRoutes
 def walletinfo():
-    auth = authorizer.Authorizer()
-
-    start = time.time()
-    auth.updateWallet()
-    elapsed = time.time() - start
-    print(f"> updateWallet took {elapsed} seconds")
-
-    start = time.time()
-    walletinfo = auth.getWalletinfo()
-    elapsed = time.time() - start
-    print(f"> getWalletinfo took {elapsed} seconds")
-
-    start = time.time()
-    rate = auth.getFee(3)
-    fee =  rate * 255/1000
-    elapsed = time.time() - start
-    print(f"> getFee took {elapsed} seconds")
-
-    start = time.time()
-    address = auth.getAddress()
-    elapsed = time.time() - start
-    print(f"> getAddress took {elapsed} seconds")
-
-    start = time.time()
-    btc_usd_rate = exchange_rate()
-    fee_usd = fee * btc_usd_rate
-    elapsed = time.time() - start
-    print(f"> exchange rates took {elapsed} seconds")
-
-    info = {
-        "wallet": walletinfo,
-        "rate": "{:.2f}".format(rate * 100000),
-        "fee": "{:.8f}".format(fee),
-        "fee_usd": "{:.2f}".format(fee_usd),
-        "staked": auth.staked,
-        "balance": auth.balance,
-        "notarizations": auth.balance//fee,
-        "address": address
-    }
+    try:
+        info = walletInfo.get()
+    except Exception as e:
+        print(f"walletinfo exception: {e}")
+        return jsonify({'error': str(e)}), 500
 
     return jsonify(info)
 
 @app.route('/api/v1/tweet', methods=['POST'])
+@twitterRoutes
 def tweet():
     data = request.get_json()
 
@@ -295,4 +410,4 @@ def tweet():
 
 if __name__ == '__main__':
     port = int(os.getenv('ARC_PORT', 5115))
-    app.run(debug=True, host='0.0.0.0', port=port)
+    serve(app, port)
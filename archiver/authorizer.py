@@ -1,14 +1,27 @@
 import os
 import json
+import time
 import argparse
 import uuid
 import base58
+import http.client
 
+from contextlib import contextmanager
+from threading import Condition, Lock
 from datetime import datetime
 from dateutil import tz
 from decimal import Decimal
 from bitcoinrpc.authproxy import AuthServiceProxy, JSONRPCException
 from cid import make_cid
+from txindex import txindex
+from certstore import certstore
+from coinselect import CoinSelector
+from rawtx import decodeRawTx
+from merkle import buildTree, leafHash, merkleStore, parseRoot, rootScript
+from pricing import fees
+
+class NotInBatchError(Exception):
+    pass
 
 class Encoder(json.JSONEncoder):
     def default(self, obj):
@@ -16,12 +29,44 @@ class Encoder(json.JSONEncoder):
             return format(float(obj), '.8f')
 
 class AuthTx():
+    __slots__ = ('tx', 'cid', 'xid', 'xid58', 'op_return', 'isValid', 'utxo')
+
     def __init__(self, tx):
         self.tx = tx
         self.cid = None
         self.xid = None
         self.isValid = self.validate()
 
+    @classmethod
+    def fromIndex(cls, row):
+        auth = cls.__new__(cls)
+        auth.tx = None
+        auth.isValid = bool(row['valid'])
+        auth.cid = row['cid']
+        auth.xid = row['xid']
+        auth.xid58 = row['xid58']
+        auth.op_return = row['op_return']
+        return auth
+
+    @classmethod
+    def fromRaw(cls, hexdata):
+        """Parse a serialized tx (getrawtransaction at verbosity 0) without keeping it."""
+        auth = cls.__new__(cls)
+        auth.tx = None
+        auth.cid = None
+        auth.xid = None
+
+        try:
+            outputs = decodeRawTx(hexdata).outputs
+        except ValueError:
+            auth.isValid = False
+            return auth
+
+        # bitcoind only calls an OP_RETURN output nulldata, and parseScript
+        # requires OP_RETURN anyway
+        auth.isValid = bool(outputs) and len(outputs[0][1]) > 1 and auth.parseScript(outputs[0][1])
+        return auth
+
     def validate(self):
         vout = self.tx['vout'][0]
         scriptPubKey = vout['scriptPubKey']
@@ -29,7 +74,9 @@ class AuthTx():
         if script_type != 'nulldata':
             return False
         hexdata = scriptPubKey['hex']
-        data = bytes.fromhex(hexdata)
+        return self.parseScript(bytes.fromhex(hexdata))
+
+    def parseScript(self, data):
         if data[0] != 0x6a:
             return False
         if data[1] != 0x46:
@@ -44,12 +91,161 @@ class AuthTx():
         except:
             return False
 
+# Raised when bitcoind closed the connection before answering, e.g. an idle
+# keep-alive connection it timed out (-rpcservertimeout). The request never ran,
+# so it is safe to send again on a new connection.
+DROPPED = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError,
+           http.client.RemoteDisconnected, http.client.CannotSendRequest)
+
+class RpcPool:
+    """Keep-alive connections to bitcoind, at most BTC_POOL_SIZE of them.
+
+    AuthServiceProxy holds one HTTP connection and is not thread-safe, so each
+    call borrows a proxy for its duration. A proxy whose connection failed is
+    dropped and a new one is made on demand. A caller waits at most
+    BTC_POOL_WAIT seconds for a proxy to be returned or dropped.
+    """
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.size = int(os.environ.get("BTC_POOL_SIZE", 4))
+        self.wait = float(os.environ.get("BTC_POOL_WAIT", 30))
+        self.idle = []
+        self.created = 0
+        self.cond = Condition()
+
+    @contextmanager
+    def proxy(self, fresh=False):
+        proxy = self.acquire(fresh)
+        try:
+            yield proxy
+        except (OSError, http.client.HTTPException):
+            self.discard()
+            raise
+        except:
+            self.release(proxy)
+            raise
+        else:
+            self.release(proxy)
+
+    def acquire(self, fresh=False):
+        """Borrow an idle proxy, or a new one if fresh or none is idle."""
+        deadline = time.time() + self.wait
+
+        with self.cond:
+            while True:
+                if self.idle and not fresh:
+                    return self.idle.pop()
+
+                if self.idle and self.created >= self.size:
+                    # Make room for the new connection
+                    self.idle.pop(0)
+                    self.created -= 1
+
+                if self.created < self.size:
+                    self.created += 1
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"no bitcoind connection free after {self.wait} seconds")
+                self.cond.wait(remaining)
+
+        try:
+            return AuthServiceProxy(self.connect, timeout=10)
+        except:
+            self.discard()
+            raise
+
+    def release(self, proxy):
+        with self.cond:
+            self.idle.append(proxy)
+            self.cond.notify()
+
+    def discard(self):
+        with self.cond:
+            self.created -= 1
+            self.cond.notify()
+
+class PooledProxy():
+    """Stands in for AuthServiceProxy, running each call on a pooled connection.
+
+    A call whose connection turns out to have been dropped is sent once more on
+    a new one.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def call(*args):
+            try:
+                with self.pool.proxy() as proxy:
+                    return getattr(proxy, name)(*args)
+            except DROPPED as error:
+                print(f"bitcoind connection dropped, retrying {name}: {str(error)}")
+
+            with self.pool.proxy(fresh=True) as proxy:
+                return getattr(proxy, name)(*args)
+
+        return call
+
 class Authorizer:
     def __init__(self):
         connect = os.environ.get("BTC_CONNECT")
         self.chain = "BTC"
-        self.blockchain = AuthServiceProxy(connect, timeout=10)
-        self.register = False
+        self.blockchain = PooledProxy(RpcPool(connect))
+        self.batchSize = int(os.environ.get("BTC_BATCH_SIZE", 100))
+        self.walletTtl = int(os.environ.get("BTC_WALLET_TTL", 30))
+        self.walletTime = None
+        self.walletStarted = None
+        self.walletLock = Lock()
+        self.staked = 0
+        self.balance = 0
+        self.funds = []
+        self.assets = []
+        self.outpoints = frozenset()
+        self.coins = CoinSelector()
+        self.keyLocks = {}
+        self.keyLock = Lock()
+
+    @contextmanager
+    def spending(self, key):
+        """Held while building and sending a transaction for key (an xid or txid).
+
+        Only transactions for the same key run one at a time. Others run in
+        parallel, since the coin selector keeps them off each other's inputs.
+        """
+        with self.keyLock:
+            entry = self.keyLocks.setdefault(key, [Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.keyLock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.keyLocks[key]
+
+    def xidOf(self, txid):
+        """The xid an auth txid notarizes, to key spending() on, or txid itself if it isn't one."""
+        self.indexTxs([txid])
+        row = txindex.get(txid)
+        return row['xid'] if row and row['valid'] else txid
+
+    @contextmanager
+    def reserving(self, funds):
+        """Release the reserved funds if the transaction using them isn't sent."""
+        try:
+            yield
+        except:
+            self.coins.release(funds)
+            raise
 
     def getChain(self):
         return self.chain
@@ -61,42 +257,152 @@ class Authorizer:
         return Decimal('0.00001111')
 
     def getFee(self, blocks):
+        return fees.get(blocks, self.blockchain.getblockcount, self.estimateFee)
+
+    def estimateFee(self, blocks):
         ret = self.blockchain.estimatesmartfee(blocks)
         return ret['feerate']
 
     def getWalletinfo(self):
         return self.blockchain.getwalletinfo()
 
+    def batch(self, calls):
+        """Send independent calls as JSON-RPC batches of up to BTC_BATCH_SIZE.
+
+        Each call is [method, *params]; results come back in call order.
+        """
+        results = []
+
+        for i in range(0, len(calls), self.batchSize):
+            # batch_ consumes the lists it is given
+            chunk = [list(call) for call in calls[i:i + self.batchSize]]
+            results.extend(self.blockchain.batch_(chunk))
+
+        return results
+
+    def indexTxs(self, txids):
+        """Index any of txids not indexed yet, returning {txid: exception} for those bitcoind couldn't return."""
+        # The serialized form is a fraction of the size of the verbose JSON
+        # and is decoded locally
+        missing = txindex.missing(txids)
+
+        try:
+            txs = self.batch([['getrawtransaction', txid] for txid in missing])
+        except JSONRPCException:
+            # One unknown txid fails the whole batch, so find out which
+            txs = []
+            for txid in missing:
+                try:
+                    txs.append(self.blockchain.getrawtransaction(txid))
+                except JSONRPCException as e:
+                    txs.append(e)
+
+        failed = {}
+        for txid, hexdata in zip(missing, txs):
+            if isinstance(hexdata, Exception):
+                failed[txid] = hexdata
+            else:
+                txindex.put(txid, AuthTx.fromRaw(hexdata))
+        return failed
+
+    def ensureWallet(self):
+        """Refresh the cached wallet state if it was invalidated or is older than BTC_WALLET_TTL."""
+        with self.walletLock:
+            if self.walletTime and time.time() - self.walletTime < self.walletTtl:
+                return
+
+        self.updateWallet()
+
+    def invalidateWallet(self):
+        with self.walletLock:
+            self.walletTime = None
+
     def updateWallet(self):
-        self.staked = 0
-        self.balance = 0
+        staked = 0
+        balance = 0
+        started = time.time()
+
+        # Wallet transactions since the last block we saw are the only ones
+        # that can carry new auth outputs
+        lastblock = txindex.getLastBlock()
+        sinceCall = ['listsinceblock', lastblock] if lastblock else ['listsinceblock']
+        since, unspent = self.batch([sinceCall, ['listunspent']])
+
+        txids = {tx['txid'] for tx in since['transactions'] if tx.get('vout') == 1}
+        txids.update(tx['txid'] for tx in unspent if tx['vout'] == 1)
+        failed = self.indexTxs(txids)
+        if failed:
+            # Moving lastblock on would skip these for good
+            raise next(iter(failed.values()))
+        txindex.setLastBlock(since['lastblock'])
 
-        unspent = self.blockchain.listunspent()
         funds = []
         assets = []
+        rows = txindex.getMany(tx['txid'] for tx in unspent if tx['vout'] == 1)
 
         for tx in unspent:
             if tx['vout'] == 1:
-                txin = self.blockchain.getrawtransaction(tx['txid'], 1)
-                auth = AuthTx(txin)
+                auth = AuthTx.fromIndex(rows[tx['txid']])
                 if auth.isValid:
                     auth.utxo = tx
                     assets.append(auth)
-                    self.staked += tx['amount']
+                    staked += tx['amount']
                 else:
                     funds.append(tx)
-                    self.balance += tx['amount']
+                    balance += tx['amount']
             else:
                 funds.append(tx)
-                self.balance += tx['amount']
+                balance += tx['amount']
+
+        # Swap in the new state at once so concurrent readers never see it half
+        # built, unless a refresh that started later got there first
+        with self.walletLock:
+            if self.walletStarted and started < self.walletStarted:
+                return
+            self.staked = staked
+            self.balance = balance
+            self.funds = funds
+            self.assets = assets
+            self.walletTime = time.time()
+            self.walletStarted = started
+            self.outpoints = frozenset((tx['txid'], tx['vout']) for tx in unspent)
+            self.coins.sync(unspent)
+
+        txindex.replaceXids(({'xid': asset.xid, 'txid': asset.utxo['txid'], 'vout': asset.utxo['vout'], 'cid': asset.cid} for asset in assets), started)
+
+    def dropSpent(self, inputs):
+        """Take inputs out of the cached wallet once a transaction spends them."""
+        spent = {(txin['txid'], txin['vout']) for txin in inputs}
+
+        with self.walletLock:
+            self.outpoints = self.outpoints - spent
+            funds = [tx for tx in self.funds if (tx['txid'], tx['vout']) not in spent]
+            assets = [asset for asset in self.assets if (asset.utxo['txid'], asset.utxo['vout']) not in spent]
+            self.balance -= sum(tx['amount'] for tx in self.funds if (tx['txid'], tx['vout']) in spent)
+            self.staked -= sum(asset.utxo['amount'] for asset in self.assets if (asset.utxo['txid'], asset.utxo['vout']) in spent)
+            self.funds = funds
+            self.assets = assets
+
+    def sendTx(self, hexdata, inputs):
+        """Broadcast a signed transaction spending inputs.
+
+        The cached wallet is kept instead of being refreshed after every send.
+        The inputs are dropped from it first, so our own transaction showing up
+        in the mempool doesn't look like someone else spending our outputs. If
+        the send fails the wallet is refreshed on next use.
+        """
+        self.dropSpent(inputs)
 
-        self.funds = funds
-        self.assets = assets
+        try:
+            return self.blockchain.sendrawtransaction(hexdata)
+        except:
+            self.invalidateWallet()
+            raise
 
     def getAddress(self):
         return self.blockchain.getnewaddress("recv")
 
-    def notarize(self, xid, cid, limit):
+    def notarize(self, xid, cid, limit, register=False):
         print(f"notarize {xid} {cid}")
 
         # Validate xid
@@ -115,30 +421,30 @@ class Authorizer:
             print(f"{cid} is not a valid IPFS CID v0")
             return
 
-        self.updateWallet()
+        self.ensureWallet()
 
         inputs = []
 
         amount = Decimal('0')
         stake = self.getStake()
 
-        for asset in self.assets:
-            if xid == asset.xid:
-                if cid == asset.cid:
-                    print(f"xid is already up to date with {cid}")
-                    return
-                inputs.append(asset.utxo)
-                amount += stake
-                break
+        current = txindex.getXid(xid)
+
+        if current:
+            if cid == current['cid']:
+                print(f"xid is already up to date with {cid}")
+                return
+            inputs.append({'txid': current['txid'], 'vout': current['vout']})
+            amount += stake
 
         if inputs:
-            if self.register:
+            if register:
                 print(f"already registered xid {xid}")
                 return
             else:
                 print(f"found utxo for {xid}")
         else:
-            if self.register:
+            if register:
                 print(f"registering xid {xid}")
             else:
                 print(f"can't find utxo for {xid}")
@@ -147,43 +453,139 @@ class Authorizer:
         txfeeRate = self.getFee(3)
         txfee = Decimal(txfeeRate * 255 / 1000)  # expected size of 255 vBytes
 
+        inputCost = Decimal(txfeeRate * 68 / 1000)  # each funding input past the first, ~68 vBytes
+
         if limit > 0 and txfee > limit:
             print(f"txfee {txfee} > limit {limit}")
             txfee = Decimal(limit)
 
-        for funtxn in self.funds:
-            funtxn["sequence"] = 0xfffffffd # make it RBF
-            inputs.append(funtxn)
-            print("inputs", funtxn['amount'])
-            amount += funtxn['amount']
-            if amount > (stake + txfee):
-                break
+        funds = self.selectFunds(stake + txfee - amount, inputCost)
 
-        if amount < (stake + txfee):
-            print('not enough funds in account', amount)
+        if funds is None:
+            print('not enough funds in account', self.balance)
             return
 
-        uuid_bytes = uuid.UUID(xid).bytes
-        xid58 = base58.b58encode(uuid_bytes).decode()
-        op_return = f'{cid}::{xid58}'
-        bytes_s = op_return.encode()
-        hexdata = bytes_s.hex()
-
-        authAddr = self.blockchain.getnewaddress("auth")
-        changeAddr = self.blockchain.getnewaddress("auth")
-        change = amount - stake - txfee
-        print(f"{change} = {amount} - {stake} - {txfee}")
-        outputs = {"data": hexdata, authAddr: str(stake), changeAddr: change}
-
-        rawtxn = self.blockchain.createrawtransaction(inputs, outputs)
-        sigtxn = self.blockchain.signrawtransactionwithwallet(rawtxn)
-        dectxn = self.blockchain.decoderawtransaction(sigtxn['hex'])
-        print('dec', json.dumps(dectxn, indent=2, cls=Encoder))
-
-        txid = self.blockchain.sendrawtransaction(sigtxn['hex'])
-        print('txid', txid)
+        with self.reserving(funds):
+            inputs.extend(funds)
+            amount += sum(funtxn['amount'] for funtxn in funds)
+            txfee = self.extraInputFee(txfee, inputCost, funds, limit)
+
+            uuid_bytes = uuid.UUID(xid).bytes
+            xid58 = base58.b58encode(uuid_bytes).decode()
+            op_return = f'{cid}::{xid58}'
+            bytes_s = op_return.encode()
+            hexdata = bytes_s.hex()
+
+            authAddr, changeAddr = self.batch([['getnewaddress', 'auth'], ['getnewaddress', 'auth']])
+            change = amount - stake - txfee
+            print(f"{change} = {amount} - {stake} - {txfee}")
+            outputs = {"data": hexdata, authAddr: str(stake), changeAddr: change}
+
+            rawtxn = self.blockchain.createrawtransaction(inputs, outputs)
+            sigtxn = self.blockchain.signrawtransactionwithwallet(rawtxn)
+            dectxn = self.blockchain.decoderawtransaction(sigtxn['hex'])
+            print('dec', json.dumps(dectxn, indent=2, cls=Encoder))
+
+            txid = self.sendTx(sigtxn['hex'], inputs)
+            print('txid', txid)
+
+        txindex.setXid(xid, txid, 1, cid)
         return txid
 
+    def selectFunds(self, target, inputCost=0):
+        """Reserve funding inputs worth more than target, or None if the free funds fall short.
+
+        The caller must send them or release them, see reserving().
+        """
+        funds = self.coins.select(self.funds, target, inputCost)
+
+        if funds is None:
+            return None
+
+        for funtxn in funds:
+            print("inputs", funtxn['amount'])
+
+        return [dict(funtxn, sequence=0xfffffffd) for funtxn in funds] # make it RBF
+
+    def extraInputFee(self, txfee, inputCost, funds, limit):
+        """The fee grown for the inputs past the first, still capped at limit."""
+        txfee += inputCost * (len(funds) - 1)
+
+        if limit > 0 and txfee > limit:
+            txfee = Decimal(limit)
+
+        return txfee
+
+    def notarizeBatch(self, updates, limit):
+        """Notarize many (xid, cid) pairs with one transaction.
+
+        Only the Merkle root of the pairs goes on-chain; the inclusion proof
+        of each pair is kept in the Merkle store for certify. Unlike notarize,
+        no auth output is spent or created, so the xid map is left as is.
+        Returns {'txid', 'root', 'rejected'} or None if it couldn't be sent,
+        where rejected lists the invalid {'xid', 'cid'} updates left out.
+        """
+        pairs = {}
+        rejected = []
+
+        for xid, cid in updates:
+            try:
+                uuid.UUID(xid)
+                cid_obj = make_cid(cid)
+                if cid_obj.version != 0:
+                    raise ValueError
+            except ValueError:
+                print(f"skipping invalid update {xid} {cid}")
+                rejected.append({'xid': xid, 'cid': cid})
+                continue
+            # The latest cid for an xid wins
+            pairs[xid] = cid
+
+        if not pairs:
+            print("nothing to notarize")
+            return {'txid': None, 'rejected': rejected}
+
+        leaves = list(pairs.items())
+        xid58s = [base58.b58encode(uuid.UUID(xid).bytes).decode() for xid in pairs]
+        root, proofs = buildTree([leafHash(cid, xid58) for (xid, cid), xid58 in zip(leaves, xid58s)])
+        print(f"notarize batch of {len(leaves)} with root {root.hex()}")
+
+        self.ensureWallet()
+
+        txfeeRate = self.getFee(3)
+        txfee = Decimal(txfeeRate * 255 / 1000)  # expected size of 255 vBytes
+
+        inputCost = Decimal(txfeeRate * 68 / 1000)  # each funding input past the first, ~68 vBytes
+
+        if limit > 0 and txfee > limit:
+            print(f"txfee {txfee} > limit {limit}")
+            txfee = Decimal(limit)
+
+        funds = self.selectFunds(txfee, inputCost)
+
+        if funds is None:
+            print('not enough funds in account', self.balance)
+            return
+
+        with self.reserving(funds):
+            amount = sum(funtxn['amount'] for funtxn in funds)
+            txfee = self.extraInputFee(txfee, inputCost, funds, limit)
+
+            changeAddr = self.blockchain.getnewaddress('auth')
+            change = amount - txfee
+            outputs = {"data": rootScript(root), changeAddr: change}
+
+            rawtxn = self.blockchain.createrawtransaction(funds, outputs)
+            sigtxn = self.blockchain.signrawtransactionwithwallet(rawtxn)
+
+            # Proofs must outlive a crash between the broadcast and the reply
+            merkleStore.save(root, leaves, proofs)
+            txid = self.sendTx(sigtxn['hex'], funds)
+            print('txid', txid)
+
+        merkleStore.setTxid(root, txid)
+        return {'txid': txid, 'root': root.hex(), 'rejected': rejected}
+
     def replaceByFee(self, txid, txfee):
         tx = self.blockchain.getrawtransaction(txid, 1)
         txfee = Decimal(txfee)
@@ -216,62 +618,159 @@ class Authorizer:
         change = tx['vout'][2]['value']
         changeAddr = tx['vout'][2]['scriptPubKey']['address']
         newChange = change + currentFee - txfee
+        funds = []
 
         if newChange < 0:
             # Need more inputs to cover increased fee
-            self.updateWallet()
-
-            for funtxn in self.funds:
-                funtxn["sequence"] = 0xfffffffd # make it RBF
-                inputs.append(funtxn)
-                print("inputs", funtxn['amount'])
-                newChange += funtxn['amount']
-                if newChange > 0:
-                    break
+            self.ensureWallet()
+            funds = self.selectFunds(-newChange)
 
-        if newChange < 0:
-            print(f"insufficent balance to cover txnfee {txfee}")
-            return;
+            if funds is None:
+                print(f"insufficent balance to cover txnfee {txfee}")
+                return;
+
+            inputs += funds
+            newChange += sum(funtxn['amount'] for funtxn in funds)
 
-        outputs = {"data": hexdata, authAddr: stake, changeAddr: newChange}
-        rawtxn = self.blockchain.createrawtransaction(inputs, outputs)
-        sigtxn = self.blockchain.signrawtransactionwithwallet(rawtxn)
-        dectxn = self.blockchain.decoderawtransaction(sigtxn['hex'])
-        print('dec', json.dumps(dectxn, indent=2, cls=Encoder))
+        with self.reserving(funds):
+            outputs = {"data": hexdata, authAddr: stake, changeAddr: newChange}
+            rawtxn = self.blockchain.createrawtransaction(inputs, outputs)
+            sigtxn = self.blockchain.signrawtransactionwithwallet(rawtxn)
+            dectxn = self.blockchain.decoderawtransaction(sigtxn['hex'])
+            print('dec', json.dumps(dectxn, indent=2, cls=Encoder))
 
-        txid = self.blockchain.sendrawtransaction(sigtxn['hex'])
-        print('txid', txid)
+            txid = self.sendTx(sigtxn['hex'], inputs)
+            print('txid', txid)
 
+        txindex.setXid(auth_tx.xid, txid, 1, auth_tx.cid)
         return txid
 
-    def certify(self, txid):
-        tx = self.blockchain.getrawtransaction(txid, 1)
+    def certify(self, txid, xid=None):
+        result = self.certifyMany([txid])[txid]
 
-        if 'blockhash' not in tx:
-            print(f"txn {txid} not yet confirmed.")
-            return
+        if result['status'] == 'error':
+            raise JSONRPCException(result['error'])
 
-        auth_tx = AuthTx(tx)
+        if 'certs' in result:
+            # A batch commitment holds one cert per xid; without one, all of them
+            if xid is None:
+                return result['certs']
 
-        if not auth_tx.isValid:
-            print(f"txn {txid} not a valid auth txn.")
-            return
+            cert = next((cert for cert in result['certs'] if cert['auth']['xid'] == xid), None)
+
+            if cert is None:
+                raise NotInBatchError(f"{xid} is not in the batch notarized by {txid}")
+
+            return cert
+
+        return result.get('cert')
+
+    def certifyMany(self, txids):
+        """Certify many txids at once, returning {txid: {'status', 'cert'?}}.
+
+        The transactions are fetched in one batch and grouped by block, so each
+        block not seen before costs one getblock however many of the txids it
+        holds. The previous transactions are resolved together as well.
 
+        A Merkle root commitment from notarizeBatch gets 'certs' instead, one
+        for each of its leaves and carrying the leaf's inclusion proof.
+        """
+        results = {}
+        todo = []
+
+        for txid in dict.fromkeys(txids):
+            cert = certstore.get(txid)
+            if isinstance(cert, list):
+                results[txid] = {'status': 'certified', 'certs': cert}
+            elif cert:
+                results[txid] = {'status': 'certified', 'cert': cert}
+            else:
+                todo.append(txid)
+
+        confirmed = []
+
+        for txid, tx in zip(todo, self.fetchTxs(todo)):
+            if isinstance(tx, Exception):
+                print(f"txn {txid} not found: {str(tx)}")
+                results[txid] = {'status': 'error', 'error': tx.error}
+                continue
+
+            if 'blockhash' not in tx:
+                print(f"txn {txid} not yet confirmed.")
+                results[txid] = {'status': 'pending'}
+                continue
+
+            auth_tx = AuthTx(tx)
+            root = None if auth_tx.isValid else parseRoot(tx)
+            leaves = merkleStore.getLeaves(root) if root else None
+
+            if not auth_tx.isValid and not leaves:
+                print(f"txn {txid} not a valid auth txn.")
+                results[txid] = {'status': 'invalid'}
+                continue
+
+            confirmed.append((txid, tx, auth_tx, leaves))
+
+        blockhashes = {tx['blockhash'] for txid, tx, auth_tx, leaves in confirmed if not certstore.getPosition(tx['txid'], tx['blockhash'])}
+
+        for block in self.batch([['getblock', blockhash] for blockhash in blockhashes]):
+            certstore.putBlock(block)
+
+        failed = self.indexTxs(list({tx['vin'][0]['txid'] for txid, tx, auth_tx, leaves in confirmed if auth_tx.isValid}))
+
+        for txid, tx, auth_tx, leaves in confirmed:
+            prev = failed.get(tx['vin'][0]['txid']) if auth_tx.isValid else None
+
+            if prev:
+                print(f"txn {txid} previous txn not found: {str(prev)}")
+                results[txid] = {'status': 'error', 'error': prev.error}
+                continue
+
+            if leaves:
+                cert = [self.makeLeafCert(tx, leaf) for leaf in leaves]
+                results[txid] = {'status': 'certified', 'certs': cert}
+            else:
+                cert = self.makeCert(tx, auth_tx)
+                results[txid] = {'status': 'certified', 'cert': cert}
+
+            # Deep enough to be final, so it never has to be built again
+            certstore.put(tx['txid'], tx['blockhash'], cert, tx.get('confirmations', 0))
+
+        return results
+
+    def fetchTxs(self, txids):
+        """Verbose transactions for txids, or the exception for any bitcoind couldn't return."""
+        try:
+            return self.batch([['getrawtransaction', txid, 1] for txid in txids])
+        except JSONRPCException:
+            # One unknown txid fails the whole batch, so find out which
+            pass
+
+        txs = []
+        for txid in txids:
+            try:
+                txs.append(self.blockchain.getrawtransaction(txid, 1))
+            except JSONRPCException as e:
+                txs.append(e)
+        return txs
+
+    def blockInfo(self, tx):
+        """Block height, ISO time and tx position for a tx whose block is in the cert store."""
+        position = certstore.getPosition(tx['txid'], tx['blockhash'])
+        utc = datetime.utcfromtimestamp(position['time']).replace(tzinfo=tz.tzutc())
+        utc_iso = utc.isoformat(timespec='seconds').replace('+00:00', 'Z')
+        return position['height'], utc_iso, position['position']
+
+    def makeCert(self, tx, auth_tx):
         txid = tx['txid']
         blockhash = tx['blockhash']
-        block = self.blockchain.getblock(blockhash)
-        block_height = block['height']
-        block_time = block['time']
-        utc = datetime.utcfromtimestamp(block_time).replace(tzinfo=tz.tzutc())
-        utc_iso = utc.isoformat(timespec='seconds').replace('+00:00', 'Z')
-        tx_index = block['tx'].index(txid)
+        prev_txid = tx['vin'][0]['txid']
+        block_height, utc_iso, tx_index = self.blockInfo(tx)
         chainid = f"urn:chain:BTC:{block_height}:{tx_index}:1"
         namespace = uuid.UUID(auth_tx.xid)
         xid = uuid.uuid5(namespace, txid)
 
-        prev_txid = tx['vin'][0]['txid']
-        prev_tx = self.blockchain.getrawtransaction(prev_txid, 1)
-        prev_auth = AuthTx(prev_tx)
+        prev_auth = AuthTx.fromIndex(txindex.get(prev_txid))
         if prev_auth.isValid and prev_auth.xid == auth_tx.xid:
             prev_xid = uuid.uuid5(namespace, prev_txid)
         else:
@@ -296,6 +795,49 @@ class Authorizer:
         print(cert)
         return cert
 
+    def makeLeafCert(self, tx, leaf):
+        txid = tx['txid']
+        block_height, utc_iso, tx_index = self.blockInfo(tx)
+        # The commitment is in output 0; there is no auth output
+        chainid = f"urn:chain:BTC:{block_height}:{tx_index}:0"
+        namespace = uuid.UUID(leaf['xid'])
+        xid58 = base58.b58encode(namespace.bytes).decode()
+        op_return = tx['vout'][0]['scriptPubKey']['hex'][4:]
+
+        return {
+            "xid": str(uuid.uuid5(namespace, txid)),
+            "prev": str(None),
+            "auth": {
+                "cid": leaf['cid'],
+                "xid": leaf['xid'],
+                "xid58": xid58,
+                "op_return": op_return,
+                "time": str(utc_iso),
+                "blockheight": block_height,
+                "blockhash": tx['blockhash'],
+                "chainid": chainid,
+                "tx": tx,
+                "merkle": {
+                    "root": leaf['root'],
+                    "leaf": leafHash(leaf['cid'], xid58).hex(),
+                    "position": leaf['position'],
+                    "proof": leaf['proof']
+                }
+            }
+        }
+
+sharedAuthorizer = None
+sharedLock = Lock()
+
+def getAuthorizer():
+    """The process-wide Authorizer, shared by all requests."""
+    global sharedAuthorizer
+
+    with sharedLock:
+        if not sharedAuthorizer:
+            sharedAuthorizer = Authorizer()
+        return sharedAuthorizer
+
 def run():
     parser = argparse.ArgumentParser(description='Run a function.')
     parser.add_argument('function', type=str,
@@ -318,10 +860,9 @@ def run():
         elif args.function == 'fund':
             print(authorizer.getAddress())
         elif args.function == 'register':
-            authorizer.register = True
             xid = 'd59d815c-1b23-4de4-a6a9-ed8ca1060184'
             cid = 'QmbNcW8SqNvJ7QuX5zQhQ7fgUtFK8W2gx7GnEgCsPaqGf4'
-            authorizer.notarize(xid, cid)
+            authorizer.notarize(xid, cid, 0, register=True)
         else:
             print(
                 f'Unknown function: {args.function}. Please use "register", "notarize".')
@@ -0,0 +1,75 @@
+import os
+import json
+
+from threading import Lock
+from store import openStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certs (
+    txid TEXT PRIMARY KEY,
+    blockhash TEXT NOT NULL,
+    cert TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    blockhash TEXT PRIMARY KEY,
+    height INTEGER NOT NULL,
+    time INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS txpos (
+    txid TEXT NOT NULL,
+    blockhash TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (txid, blockhash)
+);
+"""
+
+class CertStore:
+    """Persistent certificates plus the block data needed to build them.
+
+    A cert is stored once its transaction has CERT_CONFIRMATIONS
+    confirmations. After that it is deep enough not to be reorganized away,
+    so it is served as is without asking bitcoind.
+
+    Blocks are immutable under their hash, so the height, time and position of
+    every tx in a block are recorded the first time the block is fetched.
+    Certifying another tx from the same block then needs no getblock.
+    """
+
+    def __init__(self):
+        self.db = openStore('certs.db', SCHEMA)
+        self.confirmations = int(os.environ.get('CERT_CONFIRMATIONS', 6))
+        self.lock = Lock()
+
+    def get(self, txid):
+        with self.lock:
+            row = self.db.execute('SELECT cert FROM certs WHERE txid = ?', (txid,)).fetchone()
+        return json.loads(row['cert']) if row else None
+
+    def put(self, txid, blockhash, cert, confirmations):
+        """Store the cert (or the list of leaf certs of a batch) if it is deep enough; returns whether it was stored."""
+        if confirmations < self.confirmations:
+            return False
+
+        # bitcoind amounts are Decimals; str() is how jsonify serves them too
+        row = (txid, blockhash, json.dumps(cert, default=str))
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO certs VALUES (?, ?, ?)', row)
+
+        return True
+
+    def getPosition(self, txid, blockhash):
+        """Height, time and position of txid in blockhash, or None if the block was never indexed."""
+        with self.lock:
+            return self.db.execute(
+                'SELECT b.height, b.time, p.position FROM txpos p JOIN blocks b ON b.blockhash = p.blockhash '
+                'WHERE p.txid = ? AND p.blockhash = ?', (txid, blockhash)).fetchone()
+
+    def putBlock(self, block):
+        positions = [(txid, block['hash'], position) for position, txid in enumerate(block['tx'])]
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)', (block['hash'], block['height'], block['time']))
+            self.db.executemany('INSERT OR REPLACE INTO txpos VALUES (?, ?, ?)', positions)
+
+certstore = CertStore()
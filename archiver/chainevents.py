@@ -0,0 +1,155 @@
+import os
+import time
+
+from collections import OrderedDict
+from threading import Condition, Event, Thread
+from rawtx import decodeRawTx
+
+import authorizer
+import pricing
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+class ChainEvents:
+    """Reacts to new blocks instead of waiting to be polled.
+
+    Subscribes to bitcoind's ZMQ hashblock and rawtx feeds at the endpoints
+    in BTC_ZMQ (comma separated, e.g. tcp://bitcoind:28332). Without it, or
+    without pyzmq installed, the best block hash is polled every
+    BTC_POLL_INTERVAL seconds instead.
+
+    On each new block the fee estimates and wallet state are refreshed and
+    every watched txid is certified. Callers of wait() are woken as soon as
+    their txid has a result. A mempool tx spending one of our UTXOs marks the
+    wallet stale straight away.
+    """
+
+    def __init__(self):
+        self.endpoints = [url for url in os.environ.get('BTC_ZMQ', '').split(',') if url]
+        self.pollInterval = int(os.environ.get('BTC_POLL_INTERVAL', 30))
+        self.keep = int(os.environ.get('CHAIN_RESULTS', 1000))
+        self.pending = set()
+        self.results = OrderedDict()
+        self.cond = Condition()
+        self.newBlock = Event()
+        self.lastBlock = None
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+
+        Thread(target=self.blockLoop, name='chain-blocks', daemon=True).start()
+
+        if self.endpoints and zmq:
+            Thread(target=self.subscribe, name='chain-zmq', daemon=True).start()
+        else:
+            if self.endpoints:
+                print('pyzmq not installed, polling for blocks instead')
+            Thread(target=self.poll, name='chain-poll', daemon=True).start()
+
+    def subscribe(self):
+        socket = zmq.Context.instance().socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, b'hashblock')
+        socket.setsockopt(zmq.SUBSCRIBE, b'rawtx')
+        for endpoint in self.endpoints:
+            socket.connect(endpoint)
+
+        while True:
+            try:
+                topic, body, *_ = socket.recv_multipart()
+                if topic == b'hashblock':
+                    self.onBlock(body.hex())
+                elif topic == b'rawtx':
+                    self.onTx(body)
+            except Exception as e:
+                print(f'chain event failed: {str(e)}')
+
+    def poll(self):
+        while True:
+            try:
+                self.onBlock(authorizer.getAuthorizer().blockchain.getbestblockhash())
+            except Exception as e:
+                print(f'block poll failed: {str(e)}')
+            time.sleep(self.pollInterval)
+
+    def onBlock(self, blockhash):
+        if blockhash != self.lastBlock:
+            self.lastBlock = blockhash
+            # Handled on its own thread; blocks that arrive meanwhile are folded together
+            self.newBlock.set()
+
+    def onTx(self, raw):
+        auth = authorizer.getAuthorizer()
+        outpoints = auth.outpoints
+
+        if any(outpoint in outpoints for outpoint in decodeRawTx(raw.hex()).inputs):
+            auth.invalidateWallet()
+
+    def blockLoop(self):
+        while True:
+            self.newBlock.wait()
+            self.newBlock.clear()
+            start = time.time()
+
+            try:
+                self.processBlock()
+            except Exception as e:
+                print(f'block processing failed: {str(e)}')
+
+            elapsed = time.time() - start
+            print(f"block {self.lastBlock} processed in {elapsed} seconds")
+
+    def processBlock(self):
+        auth = authorizer.getAuthorizer()
+        pricing.fees.invalidate()
+        auth.invalidateWallet()
+        auth.ensureWallet()
+
+        with self.cond:
+            txids = list(self.pending)
+
+        if txids:
+            self.publish(auth.certifyMany(txids))
+
+    def publish(self, results):
+        with self.cond:
+            for txid, result in results.items():
+                if result['status'] == 'pending':
+                    continue
+                self.pending.discard(txid)
+                self.results[txid] = result
+                self.results.move_to_end(txid)
+
+            while len(self.results) > self.keep:
+                self.results.popitem(last=False)
+
+            self.cond.notify_all()
+
+    def watch(self, txid):
+        """Certify txid as soon as it confirms."""
+        if txid:
+            with self.cond:
+                self.pending.add(txid)
+
+    def wait(self, txid, timeout):
+        """The certify result for txid, waiting up to timeout seconds for its block."""
+        with self.cond:
+            if txid in self.results:
+                return self.results[txid]
+
+        result = authorizer.getAuthorizer().certifyMany([txid])[txid]
+
+        if result['status'] != 'pending':
+            return result
+
+        with self.cond:
+            self.pending.add(txid)
+            self.cond.wait_for(lambda: txid in self.results, timeout)
+            return self.results.get(txid, result)
+
+chainEvents = ChainEvents()
@@ -0,0 +1,74 @@
+import os
+import time
+
+from threading import Lock
+
+def outpoint(utxo):
+    return (utxo['txid'], utxo['vout'])
+
+def amountOf(utxo):
+    return utxo['amount']
+
+class CoinSelector:
+    """Picks funding UTXOs for new transactions and reserves them.
+
+    A reserved UTXO isn't offered to anyone else, so transactions built at
+    the same time never pick the same inputs. A reservation ends when
+    release() is called because the transaction failed, or when the wallet
+    stops listing the UTXO as unspent because it was spent. Any reservation
+    older than COIN_RESERVE_TTL seconds also ends, in case its transaction
+    dropped out of the mempool.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('COIN_RESERVE_TTL', 600))
+        self.reserved = {}
+        self.lock = Lock()
+
+    def select(self, funds, target, inputCost=0):
+        """Reserve and return inputs worth more than target, or None if the free funds can't cover it.
+
+        Every input after the first adds inputCost to the target.
+        """
+        with self.lock:
+            free = [utxo for utxo in funds if outpoint(utxo) not in self.reserved]
+            chosen = self.choose(free, target, inputCost)
+
+            if chosen:
+                now = time.time()
+                for utxo in chosen:
+                    self.reserved[outpoint(utxo)] = now
+
+        return chosen
+
+    @staticmethod
+    def choose(free, target, inputCost):
+        # A single input keeps the tx at the size the fee was estimated for,
+        # and the smallest one that covers the target leaves the least change
+        covering = [utxo for utxo in free if utxo['amount'] > target]
+        if covering:
+            return [min(covering, key=amountOf)]
+
+        # Otherwise take the largest first for the fewest inputs
+        chosen = []
+        total = 0
+        for utxo in sorted(free, key=amountOf, reverse=True):
+            chosen.append(utxo)
+            total += utxo['amount']
+            if total > target + inputCost * (len(chosen) - 1):
+                return chosen
+
+        return None
+
+    def release(self, utxos):
+        with self.lock:
+            for utxo in utxos:
+                self.reserved.pop(outpoint(utxo), None)
+
+    def sync(self, unspent):
+        """End the reservations of UTXOs that were spent or held too long."""
+        unspent = {outpoint(utxo) for utxo in unspent}
+        expired = time.time() - self.ttl
+
+        with self.lock:
+            self.reserved = {point: since for point, since in self.reserved.items() if point in unspent and since > expired}
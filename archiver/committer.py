@@ -0,0 +1,229 @@
+import os
+import time
+import json
+import fcntl
+
+from git.exc import GitCommandError
+from threading import Condition, Event, Lock, Thread
+
+class CommitError(Exception):
+    pass
+
+class RepoLock:
+    """Write lock for the data repo, held by whatever changes its index or refs.
+
+    Besides excluding other threads it holds an flock on a file in .git, so
+    a second archiver process on the same repo (e.g. an old and a new
+    container overlapping during a deploy) waits its turn too.
+    """
+
+    def __init__(self, repo):
+        self.lock = Lock()
+        self.file = open(os.path.join(repo.git_dir, 'artx-write.lock'), 'a')
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        except:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.lock.release()
+
+class CommitRequest():
+    def __init__(self, message, paths=None):
+        self.message = message
+        self.paths = paths
+        self.githash = None
+        self.error = None
+        self.done = Event()
+
+class GroupCommitter:
+    """Single writer for the data repo.
+
+    Callers queue their commit messages and block until a background thread
+    has folded them into one `git add` plus commit. Requests that arrive
+    within COMMIT_WINDOW milliseconds of the first one, up to COMMIT_BATCH of
+    them, share a commit whose message holds one event per line.
+
+    Requests may name the paths they touched so only those are staged; a
+    single request without paths makes its batch fall back to a full add.
+    Every COMMIT_RECONCILE seconds a full add picks up anything a partial
+    add missed.
+
+    Functions in `listeners` are called with the githash and the messages of
+    each successful commit, on the writer thread and before the callers are
+    released, so whatever they record is in place once commit() returns.
+    """
+
+    def __init__(self, repo, lock):
+        self.repo = repo
+        self.lock = lock
+        self.window = int(os.environ.get('COMMIT_WINDOW', 10)) / 1000
+        self.maxBatch = max(1, int(os.environ.get('COMMIT_BATCH', 100)))
+        self.pending = []
+        self.cond = Condition()
+        self.listeners = []
+        self.resetStats()
+        self.reconcileInterval = int(os.environ.get('COMMIT_RECONCILE', 300))
+        self.thread = Thread(target=self.run, name='committer', daemon=True)
+        self.thread.start()
+
+        if self.reconcileInterval > 0:
+            Thread(target=self.reconcileLoop, name='reconciler', daemon=True).start()
+
+    def commit(self, message, paths=None):
+        req = CommitRequest(message, self.repoPaths(paths))
+
+        with self.cond:
+            self.pending.append(req)
+            self.cond.notify()
+
+        req.done.wait()
+
+        if req.error:
+            raise CommitError(req.error)
+
+        return req.githash
+
+    def repoPaths(self, paths):
+        """Map caller paths (relative to our cwd, like data/assets/<xid>) into the data repo.
+
+        Returns None, meaning stage everything, if no paths were given or any
+        of them falls outside the repo.
+        """
+        if not paths:
+            return None
+
+        root = os.path.abspath(self.repo.working_tree_dir)
+        relpaths = []
+
+        for path in paths:
+            relpath = os.path.relpath(os.path.abspath(path), root)
+            if relpath == '.' or relpath.startswith('..'):
+                return None
+            relpaths.append(relpath)
+
+        return relpaths
+
+    def reconcileLoop(self):
+        while True:
+            time.sleep(self.reconcileInterval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f'reconcile failed: {str(e)}')
+
+    def reconcile(self):
+        with self.lock:
+            dirty = self.repo.is_dirty(untracked_files=True)
+
+        if dirty:
+            githash = self.commit(json.dumps({'type': 'reconcile'}))
+            print(f'reconciled untracked changes in {githash[:8]}')
+
+    def run(self):
+        while True:
+            batch = self.nextBatch()
+            self.flush(batch)
+
+    def nextBatch(self):
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+
+            deadline = time.time() + self.window
+
+            while len(self.pending) < self.maxBatch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+            batch = self.pending[:self.maxBatch]
+            self.pending = self.pending[self.maxBatch:]
+
+        return batch
+
+    def flush(self, batch):
+        message = '\n'.join(req.message for req in batch)
+        githash = None
+        error = None
+
+        paths = set()
+        for req in batch:
+            if req.paths is None:
+                paths = None
+                break
+            paths.update(req.paths)
+
+        start = time.time()
+
+        with self.lock:
+            try:
+                self.stage(paths)
+                # A change may already have been swept into an earlier commit,
+                # so an empty commit still records the event and gives its githash
+                self.repo.git.commit('--allow-empty', '-m', message)
+                githash = self.repo.git.rev_parse('HEAD')
+                print(f'git commit successful: {len(batch)} event(s) in {githash[:8]}')
+            except GitCommandError as e:
+                error = str(e)
+                print(f'Failed to commit changes: {error}')
+            except Exception as e:
+                error = f'An unexpected error occurred: {str(e)}'
+                print(f'Failed to commit changes: {error}')
+
+        elapsed = time.time() - start
+
+        with self.cond:
+            self.flushes += 1
+            self.flushTime += elapsed
+            self.flushMax = max(self.flushMax, elapsed)
+
+        if githash:
+            self.notify(githash, [req.message for req in batch])
+
+        for req in batch:
+            req.githash = githash
+            req.error = error
+            req.done.set()
+
+    def resetStats(self):
+        self.flushes = 0
+        self.flushTime = 0
+        self.flushMax = 0
+
+    def flushStats(self, reset=False):
+        """Commits made since the last reset, with their average and longest duration in seconds."""
+        with self.cond:
+            stats = {
+                'commits': self.flushes,
+                'avg': self.flushTime / self.flushes if self.flushes else None,
+                'max': self.flushMax,
+            }
+            if reset:
+                self.resetStats()
+        return stats
+
+    def notify(self, githash, messages):
+        for listener in self.listeners:
+            try:
+                listener(githash, messages)
+            except Exception as e:
+                print(f'commit listener failed: {str(e)}')
+
+    def stage(self, paths):
+        if paths:
+            try:
+                self.repo.git.add('--all', '--', *sorted(paths))
+                return
+            except GitCommandError as e:
+                # e.g. a pathspec that matches nothing on disk or in the index
+                print(f'partial add failed, staging everything: {str(e)}')
+
+        self.repo.git.add('--all')
@@ -0,0 +1,158 @@
+import json
+import time
+
+from datetime import datetime
+from threading import Lock
+from git.exc import GitCommandError
+from store import openStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    type TEXT,
+    agent TEXT,
+    asset TEXT,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_type ON events (type, id);
+CREATE INDEX IF NOT EXISTS events_agent ON events (agent, id);
+CREATE INDEX IF NOT EXISTS events_asset ON events (asset, id);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+FILTERS = ('type', 'agent', 'asset')
+
+# Commits the archiver makes for its own upkeep (see GroupCommitter.reconcile),
+# which aren't events anyone did
+UPKEEP = ('reconcile',)
+
+class EventLog:
+    """Append-only index of the events committed to the data repo.
+
+    Rows are appended in commit order, so the row id doubles as the
+    pagination cursor (newest first). Reads never touch git or the commit
+    lock.
+    """
+
+    def __init__(self):
+        self.db = openStore('events.db', SCHEMA)
+        self.lock = Lock()
+
+        # Indexes built before upkeep commits were left out may still hold some
+        with self.db:
+            self.db.execute(f"DELETE FROM events WHERE type IN ({','.join('?' * len(UPKEEP))})", UPKEEP)
+
+    def append(self, githash, messages, date=None):
+        rows = self.parse(githash, messages, date)
+
+        with self.lock, self.db:
+            self.insert(rows)
+
+    def parse(self, githash, messages, date=None):
+        date = date or datetime.now().astimezone()
+        rows = []
+
+        for message in messages:
+            for line in message.split('\n'):
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Failed to decode JSON: {line}")
+                    continue
+
+                if not isinstance(event, dict) or event.get('type') in UPKEEP:
+                    continue
+
+                fields = [event.get(name) if isinstance(event.get(name), str) else None for name in FILTERS]
+                rows.append((int(date.timestamp()), date.isoformat(), githash[:7], *fields, line))
+
+        return rows
+
+    def insert(self, rows):
+        self.db.executemany('INSERT INTO events (ts, date, hash, type, agent, asset, event) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def query(self, since=None, cursor=None, limit=None, **filters):
+        """Events newest first, plus the cursor for the next page (None on the last one)."""
+        sql = 'SELECT * FROM events WHERE 1 = 1'
+        params = []
+
+        if cursor:
+            sql += ' AND id < ?'
+            params.append(cursor)
+
+        if since:
+            sql += ' AND ts >= ?'
+            params.append(int(since))
+
+        for name in FILTERS:
+            if filters.get(name):
+                sql += f' AND {name} = ?'
+                params.append(filters[name])
+
+        sql += ' ORDER BY id DESC'
+
+        if limit:
+            # One extra row tells us whether there is another page
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+
+        next = None
+
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next = rows[-1]['id']
+
+        logs = []
+        for row in rows:
+            event = json.loads(row['event'])
+            event['hash'] = row['hash']
+            event['date'] = row['date']
+            logs.append(event)
+
+        return logs, next
+
+    def backfill(self, repo):
+        """One-time import of the events already in the repo's history."""
+        with self.lock:
+            done = self.db.execute("SELECT 1 FROM meta WHERE name = 'backfilled'").fetchone()
+
+        if done:
+            return
+
+        start = time.time()
+
+        try:
+            raw_logs = repo.git.log('--reverse', '--date=iso-strict', '--pretty=format:%H%x1f%ad%x1f%B%x1e').split('\x1e')
+        except GitCommandError as error:
+            # No commits yet
+            print(f'event log backfill skipped: {str(error)}')
+            raw_logs = []
+
+        commits = 0
+
+        # All or nothing, so a backfill cut short is redone from scratch
+        # rather than leaving a partial history or importing it twice
+        with self.lock, self.db:
+            for log in raw_logs:
+                fields = log.strip('\n').split('\x1f')
+                if len(fields) == 3:
+                    githash, date_str, body = fields
+                    self.insert(self.parse(githash, [body.strip()], datetime.fromisoformat(date_str)))
+                    commits += 1
+
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('backfilled', ?)", (str(int(start)),))
+
+        elapsed = time.time() - start
+        print(f"event log backfilled {commits} commits in {elapsed} seconds")
+
+eventLog = EventLog()
@@ -0,0 +1,70 @@
+import os
+import time
+
+from threading import Thread
+
+class Checker:
+    """Runs a probe every HEALTH_INTERVAL seconds on its own thread and keeps the last result.
+
+    Exposes the same healthy/checked/latency/error fields as ipfs.IpfsPool so
+    both can be reported by Health.
+    """
+
+    def __init__(self, name, probe):
+        self.name = name
+        self.probe = probe
+        self.interval = int(os.environ.get('HEALTH_INTERVAL', 5))
+        self.healthy = False
+        self.checked = None
+        self.latency = None
+        self.error = None
+        Thread(target=self.monitor, name=f'health-{name}', daemon=True).start()
+
+    def check(self):
+        start = time.time()
+        try:
+            self.probe()
+            self.healthy = True
+            self.error = None
+        except Exception as error:
+            if self.healthy:
+                print(f"{self.name} health check failed: {str(error)}")
+            self.healthy = False
+            self.error = str(error)
+        self.latency = time.time() - start
+        self.checked = time.time()
+
+    def monitor(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+
+class Health:
+    """Last known state of each dependency, read in constant time.
+
+    A result older than HEALTH_MAX_AGE seconds counts as unhealthy, since its
+    checker is probably stuck on the dependency.
+    """
+
+    def __init__(self):
+        self.maxAge = int(os.environ.get('HEALTH_MAX_AGE', 30))
+        self.checks = {}
+
+    def add(self, name, check):
+        self.checks[name] = check
+
+    def status(self):
+        now = time.time()
+        checks = {}
+
+        for name, check in self.checks.items():
+            age = now - check.checked if check.checked else None
+            checks[name] = {
+                'ok': check.healthy and age is not None and age < self.maxAge,
+                'age': age,
+                'latency': check.latency,
+                'error': check.error,
+            }
+
+        ready = all(check['ok'] for check in checks.values())
+        return {'ready': ready, 'checks': checks}
@@ -1,7 +1,11 @@
 import os
 import time
+import queue
 import ipfshttpclient
+from contextlib import contextmanager
+from threading import Lock, Thread
 from ipfshttpclient.exceptions import Error as IPFSError
+from ipfshttpclient.exceptions import CommunicationError
 
 def getIpfs():
     connect = os.environ.get('IPFS_CONNECT')
@@ -9,19 +13,129 @@ def getIpfs():
 
     print(f"connecting to IPFS {connect} with timeout={timeout}")
 
+    # session=True keeps the HTTP connection alive between calls
     if connect:
-        return ipfshttpclient.connect(connect, timeout=timeout)
+        return ipfshttpclient.connect(connect, timeout=timeout, session=True)
     else:
-        return ipfshttpclient.connect(timeout=timeout)
+        return ipfshttpclient.connect(timeout=timeout, session=True)
 
+class IpfsPool:
+    """Process-wide pool of keep-alive IPFS clients.
 
-def checkIpfs():
-    for i in range(10):
+    Clients are created lazily up to IPFS_POOL_SIZE and handed out one per
+    caller, so no client is shared between threads. A background thread
+    probes the node every IPFS_HEALTH_INTERVAL seconds and records the result,
+    so request handlers can check health without connecting or retrying. The
+    probe has a client of its own, so a pool busy with pins can't make the
+    node look down.
+    """
+
+    def __init__(self):
+        self.size = int(os.environ.get('IPFS_POOL_SIZE', 4))
+        self.interval = int(os.environ.get('IPFS_HEALTH_INTERVAL', 5))
+        self.waitTimeout = int(os.environ.get('IPFS_TIMEOUT', 5))
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = Lock()
+        self.healthy = False
+        self.checked = None
+        self.latency = None
+        self.error = None
+        self.probe = None
+        Thread(target=self.monitor, name='ipfs-health', daemon=True).start()
+
+    @contextmanager
+    def client(self):
+        ipfs = self.acquire()
+        try:
+            yield ipfs
+        except CommunicationError:
+            # The connection is suspect, drop it and reconnect on next use
+            self.discard(ipfs)
+            raise
+        except:
+            self.release(ipfs)
+            raise
+        else:
+            self.release(ipfs)
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+
+        if create:
+            try:
+                return getIpfs()
+            except:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        try:
+            return self.idle.get(timeout=self.waitTimeout)
+        except queue.Empty:
+            raise IPFSError('timed out waiting for an IPFS connection')
+
+    def release(self, ipfs):
+        self.idle.put(ipfs)
+
+    def discard(self, ipfs):
+        with self.lock:
+            self.created -= 1
         try:
-            ipfs = getIpfs()
-            # print(ipfs.id())
-            return True
+            ipfs.close()
         except:
-            print(i, "attempting to connect to IPFS...")
-            time.sleep(1)
-    return False
+            pass
+
+    def reset(self):
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def check(self):
+        start = time.time()
+        try:
+            if not self.probe:
+                self.probe = getIpfs()
+            self.probe.id()
+            self.healthy = True
+            self.error = None
+        except Exception as error:
+            if self.healthy:
+                print(f"IPFS health check failed: {str(error)}")
+            self.healthy = False
+            self.error = str(error)
+            self.dropProbe()
+            self.reset()
+        self.latency = time.time() - start
+        self.checked = time.time()
+
+    def dropProbe(self):
+        if self.probe:
+            try:
+                self.probe.close()
+            except:
+                pass
+            self.probe = None
+
+    def monitor(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+
+pool = IpfsPool()
+
+def checkIpfs():
+    return pool.healthy
+
+def ipfsClient():
+    return pool.client()
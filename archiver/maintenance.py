@@ -0,0 +1,149 @@
+import os
+import time
+
+from collections import deque
+from datetime import datetime
+from git.exc import GitCommandError
+from threading import Lock, Thread
+
+TASKS = ['pack-refs', 'loose-objects', 'incremental-repack', 'commit-graph']
+
+class RepoMaintenance:
+    """Keeps the data repo fast as its history grows.
+
+    Every MAINT_INTERVAL seconds, once no commit has landed for MAINT_IDLE
+    seconds, it runs the git maintenance tasks in TASKS one at a time under
+    the commit lock. It gives way to any commit that queues up in between.
+    At startup the index is switched to a split index with an untracked
+    cache. The fsmonitor is also enabled if MAINT_FSMONITOR is set and git
+    supports it here.
+
+    Each run records how long `git status` and `git log` take before and
+    after, and the average commit time since the previous run, so the effect
+    shows in /api/v1/maintenance.
+    """
+
+    def __init__(self, repo, lock, committer):
+        self.repo = repo
+        self.lock = lock
+        self.committer = committer
+        self.interval = int(os.environ.get('MAINT_INTERVAL', 3600))
+        self.idle = int(os.environ.get('MAINT_IDLE', 60))
+        self.fsmonitor = bool(os.environ.get('MAINT_FSMONITOR'))
+        self.lastCommit = time.time()
+        self.lastRun = None
+        self.running = False
+        self.history = deque(maxlen=int(os.environ.get('MAINT_HISTORY', 24)))
+        self.statsLock = Lock()
+
+        committer.listeners.append(self.committed)
+
+        if self.interval > 0:
+            Thread(target=self.run, name='maintenance', daemon=True).start()
+
+    def committed(self, githash, messages):
+        self.lastCommit = time.time()
+
+    def isIdle(self):
+        return time.time() - self.lastCommit >= self.idle and not self.committer.pending
+
+    def run(self):
+        try:
+            self.tuneIndex()
+        except GitCommandError as error:
+            print(f'index tuning failed: {str(error)}')
+
+        while True:
+            time.sleep(min(self.interval, self.idle) or 1)
+
+            if self.lastRun and time.time() - self.lastRun < self.interval:
+                continue
+
+            if not self.isIdle():
+                continue
+
+            if self.lastRun and not self.committer.flushes:
+                # Nothing was committed since the last run
+                continue
+
+            try:
+                self.maintain()
+            except Exception as error:
+                print(f'maintenance failed: {str(error)}')
+
+    def tuneIndex(self):
+        with self.lock:
+            with self.repo.config_writer() as config:
+                config.set_value('core', 'untrackedCache', 'true')
+                config.set_value('core', 'splitIndex', 'true')
+                if self.fsmonitor:
+                    config.set_value('core', 'fsmonitor', 'true')
+
+            self.repo.git.update_index('--untracked-cache', '--split-index')
+
+            if self.fsmonitor:
+                try:
+                    self.repo.git.fsmonitor__daemon('start')
+                except GitCommandError as error:
+                    # The built-in daemon isn't available on every platform
+                    print(f'fsmonitor not available: {str(error)}')
+                    with self.repo.config_writer() as config:
+                        config.set_value('core', 'fsmonitor', 'false')
+
+    def probe(self):
+        timings = {}
+
+        # status would otherwise refresh the index and take index.lock, failing
+        # a git add from the committer that runs at the same moment
+        for name, command in [('status', lambda: self.repo.git.status('--porcelain', env={'GIT_OPTIONAL_LOCKS': '0'})),
+                              ('log', lambda: self.repo.git.log('-100', '--pretty=format:%h'))]:
+            start = time.time()
+            command()
+            timings[name] = time.time() - start
+
+        return timings
+
+    def maintain(self):
+        self.running = True
+        started = time.time()
+        record = {
+            'time': datetime.fromtimestamp(started).astimezone().isoformat(),
+            'commit': self.committer.flushStats(reset=True),
+            'before': self.probe(),
+            'tasks': {},
+        }
+
+        try:
+            for task in TASKS:
+                if not self.isIdle():
+                    # A commit is waiting; finish the rest next time
+                    record['interrupted'] = task
+                    break
+
+                start = time.time()
+                with self.lock:
+                    self.repo.git.maintenance('run', f'--task={task}', '--quiet')
+                record['tasks'][task] = time.time() - start
+        finally:
+            self.running = False
+
+        record['after'] = self.probe()
+        self.lastRun = started
+
+        with self.statsLock:
+            self.history.append(record)
+
+        elapsed = time.time() - started
+        print(f"data repo maintenance took {elapsed} seconds: {record}")
+
+    def status(self):
+        with self.statsLock:
+            history = list(self.history)
+
+        return {
+            'running': self.running,
+            'idle': self.isIdle(),
+            'lastRun': datetime.fromtimestamp(self.lastRun).astimezone().isoformat() if self.lastRun else None,
+            'commit': self.committer.flushStats(),
+            'history': history,
+        }
@@ -0,0 +1,108 @@
+import json
+import hashlib
+
+from threading import Lock
+from store import openStore
+
+# A root commitment is OP_RETURN <tag + 32 byte root>. Its 0x24 push length
+# can never be mistaken for the 0x46 push of a single cid::xid58 pair.
+ROOT_TAG = b'artx'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leaves (
+    root TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    xid TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    proof TEXT NOT NULL,
+    PRIMARY KEY (root, position)
+);
+CREATE INDEX IF NOT EXISTS leaves_xid ON leaves (xid);
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    txid TEXT
+);
+"""
+
+def sha256(data):
+    return hashlib.sha256(data).digest()
+
+def leafHash(cid, xid58):
+    # Leaves and inner nodes are prefixed differently so one can't pose as the other
+    return sha256(b'\x00' + f'{cid}::{xid58}'.encode())
+
+def nodeHash(left, right):
+    return sha256(b'\x01' + left + right)
+
+def buildTree(leaves):
+    """Merkle root and one inclusion proof per leaf.
+
+    A proof lists the sibling hashes from the leaf up, each with the side it
+    sits on. An odd node at the end of a level is carried up unchanged rather
+    than paired with itself.
+    """
+    proofs = [[] for _ in leaves]
+    level = [(leaf, [i]) for i, leaf in enumerate(leaves)]
+
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            (left, lmembers), (right, rmembers) = level[i], level[i + 1]
+            for member in lmembers:
+                proofs[member].append({'side': 'right', 'hash': right.hex()})
+            for member in rmembers:
+                proofs[member].append({'side': 'left', 'hash': left.hex()})
+            parents.append((nodeHash(left, right), lmembers + rmembers))
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+
+    return level[0][0], proofs
+
+def verifyProof(leaf, proof, root):
+    node = leaf
+    for step in proof:
+        sibling = bytes.fromhex(step['hash'])
+        node = nodeHash(sibling, node) if step['side'] == 'left' else nodeHash(node, sibling)
+    return node == root
+
+def rootScript(root):
+    return (ROOT_TAG + root).hex()
+
+def parseRoot(tx):
+    """The Merkle root committed by tx, or None if it isn't a root commitment."""
+    scriptPubKey = tx['vout'][0]['scriptPubKey']
+    if scriptPubKey['type'] != 'nulldata':
+        return None
+    data = bytes.fromhex(scriptPubKey['hex'])
+    if len(data) != 2 + len(ROOT_TAG) + 32 or data[0] != 0x6a or data[1] != len(ROOT_TAG) + 32:
+        return None
+    if not data[2:].startswith(ROOT_TAG):
+        return None
+    return data[2 + len(ROOT_TAG):]
+
+class MerkleStore:
+    """The leaves and inclusion proofs of each batch, keyed by root."""
+
+    def __init__(self):
+        self.db = openStore('merkle.db', SCHEMA)
+        self.lock = Lock()
+
+    def save(self, root, leaves, proofs):
+        """Record a batch before its root is broadcast, so a sent root always has its proofs."""
+        rows = [(root.hex(), i, xid, cid, json.dumps(proof)) for i, ((xid, cid), proof) in enumerate(zip(leaves, proofs))]
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR IGNORE INTO roots VALUES (?, NULL)', (root.hex(),))
+            self.db.executemany('INSERT OR REPLACE INTO leaves VALUES (?, ?, ?, ?, ?)', rows)
+
+    def setTxid(self, root, txid):
+        with self.lock, self.db:
+            self.db.execute('UPDATE roots SET txid = ? WHERE root = ?', (txid, root.hex()))
+
+    def getLeaves(self, root):
+        with self.lock:
+            rows = self.db.execute('SELECT * FROM leaves WHERE root = ? ORDER BY position', (root.hex(),)).fetchall()
+        return [dict(row, proof=json.loads(row['proof'])) for row in rows]
+
+merkleStore = MerkleStore()
@@ -0,0 +1,172 @@
+import os
+import time
+import posixpath
+
+from datetime import datetime
+from git.exc import GitCommandError
+from threading import Condition, Lock, Thread
+from ipfs import checkIpfs, ipfsClient, IPFSError
+from store import openStore
+
+# git's well-known empty tree; diffing against it lists every file
+EMPTY_TREE = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    githash TEXT PRIMARY KEY,
+    cid TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class DataMirror:
+    """Mirrors the committed data repo into an IPFS MFS tree at MIRROR_PATH.
+
+    After each commit only the paths that git diff reports as changed since
+    the last mirrored commit are written or removed, so the cost follows the
+    size of the change. The first run diffs against the empty tree, which
+    imports everything once. File contents come from the commit itself, not
+    the working tree, so each snapshot matches its githash exactly.
+
+    Every snapshot's root CID is recorded with its githash. MFS content is
+    kept by the node without pinning.
+    """
+
+    def __init__(self, repo, committer):
+        self.repo = repo
+        self.root = os.environ.get('MIRROR_PATH', '/artx-data')
+        self.retry = int(os.environ.get('MIRROR_RETRY', 30))
+        self.db = openStore('mirror.db', SCHEMA)
+        self.lock = Lock()
+        self.cond = Condition()
+        self.dirty = True
+        committer.listeners.append(self.committed)
+        Thread(target=self.run, name='mirror', daemon=True).start()
+
+    def committed(self, githash, messages):
+        with self.cond:
+            self.dirty = True
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.dirty:
+                    self.cond.wait()
+                # Commits made meanwhile are folded into the next diff
+                self.dirty = False
+
+            try:
+                if checkIpfs():
+                    self.update()
+                    continue
+                print('IPFS not available, mirror update postponed')
+            except (IPFSError, GitCommandError) as error:
+                print(f'mirror update failed: {str(error)}')
+
+            with self.cond:
+                self.dirty = True
+                self.cond.wait(self.retry)
+
+    def lastMirrored(self):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM state WHERE name = 'githash'").fetchone()
+        return row['value'] if row else None
+
+    def update(self):
+        try:
+            githash = self.repo.git.rev_parse('HEAD')
+        except GitCommandError:
+            # No commits yet
+            return
+
+        last = self.lastMirrored()
+
+        if last == githash:
+            return
+
+        start = time.time()
+        reimport = last and not self.exists(last)
+
+        if reimport:
+            print(f'last mirrored commit {last[:8]} is gone, importing everything again')
+
+        commit = self.repo.commit(githash)
+        base = EMPTY_TREE if not last or reimport else last
+        changes = self.repo.git.diff('--name-status', '--no-renames', '-z', base, githash).split('\0')
+        changes = list(zip(changes[0::2], changes[1::2]))
+
+        with ipfsClient() as ipfs:
+            if reimport:
+                self.remove(ipfs, self.root)
+
+            made = set()
+            self.ensureDir(ipfs, self.root, made)
+
+            for status, path in changes:
+                target = posixpath.join(self.root, path)
+                if status == 'D':
+                    self.remove(ipfs, target)
+                else:
+                    self.write(ipfs, target, commit.tree / path, made)
+
+            cid = ipfs.files.stat(self.root)['Hash']
+
+        now = datetime.now().astimezone().isoformat()
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)', (githash, cid, now))
+            self.db.execute("INSERT OR REPLACE INTO state VALUES ('githash', ?)", (githash,))
+
+        elapsed = time.time() - start
+        print(f"mirrored {githash[:8]} as {cid}: {len(changes)} change(s) in {elapsed} seconds")
+
+    def exists(self, githash):
+        try:
+            self.repo.git.cat_file('-e', f'{githash}^{{commit}}')
+            return True
+        except GitCommandError:
+            return False
+
+    def ensureDir(self, ipfs, path, made):
+        if path not in made:
+            ipfs.files.mkdir(path, parents=True)
+            made.add(path)
+
+    def write(self, ipfs, target, blob, made):
+        if not hasattr(blob, 'data_stream'):
+            # A submodule; there is no content to mirror
+            return
+
+        self.ensureDir(ipfs, posixpath.dirname(target), made)
+        # Streamed from git in chunks, so large media never sits in memory whole
+        ipfs.files.write(target, blob.data_stream, create=True, truncate=True)
+
+    def remove(self, ipfs, target):
+        try:
+            ipfs.files.rm(target, recursive=True)
+        except IPFSError:
+            # Already gone, e.g. when an earlier update was interrupted
+            return
+
+        # git has no empty directories, so the mirror shouldn't either
+        parent = posixpath.dirname(target)
+        try:
+            while parent.startswith(self.root + '/') and not ipfs.files.ls(parent).get('Entries'):
+                ipfs.files.rm(parent, recursive=True)
+                parent = posixpath.dirname(parent)
+        except IPFSError:
+            pass
+
+    def snapshot(self, githash=None):
+        """The mirror's root CID for githash (full or abbreviated), or the latest snapshot."""
+        with self.lock:
+            if githash:
+                row = self.db.execute('SELECT * FROM snapshots WHERE githash LIKE ?', (githash + '%',)).fetchone()
+            else:
+                row = self.db.execute("SELECT s.* FROM snapshots s JOIN state ON state.name = 'githash' AND state.value = s.githash").fetchone()
+        return dict(row) if row else None
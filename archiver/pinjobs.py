@@ -0,0 +1,197 @@
+import os
+import time
+import uuid
+import queue
+
+from threading import Event, Lock, Thread
+from ipfs import checkIpfs, ipfsClient, IPFSError
+
+import pinning
+
+STREAM_BUFFER = int(os.environ.get('PIN_STREAM_BUFFER', 1000))
+
+class PinJob():
+    def __init__(self, path, stream=False):
+        self.id = str(uuid.uuid4())
+        self.path = path
+        self.state = 'queued'
+        self.files = 0
+        self.total = None
+        self.bytes = 0
+        self.cid = None
+        self.cids = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = Event()
+        self.watchers = []
+        # Bounded, so a slow reader holds the pin back instead of piling up entries
+        self.stream = queue.Queue(maxsize=STREAM_BUFFER) if stream else None
+        self.closed = False
+
+    def scanned(self, total):
+        self.total = total
+
+    def progress(self, files, hashed):
+        self.files += files
+        self.bytes += hashed
+
+    def send(self, item):
+        while not self.closed:
+            try:
+                self.stream.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def emit(self, name, cid):
+        self.send((name, cid))
+
+    def entries(self):
+        """Yield (name, cid) for each entry of a streaming job as it is pinned.
+
+        Stops once the job is finished; see cid and error for the outcome.
+        Closing the generator early lets the pin carry on without it.
+        """
+        try:
+            while True:
+                entry = self.stream.get()
+                if entry is None:
+                    return
+                yield entry
+        finally:
+            self.close()
+
+    def close(self):
+        self.closed = True
+
+    def finish(self):
+        if self.stream:
+            self.send(None)
+        self.done.set()
+
+    def status(self):
+        status = {
+            'job': self.id,
+            'path': self.path,
+            'state': self.state,
+            'files': self.files,
+            'total': self.total,
+            'bytes': self.bytes,
+        }
+
+        if self.state == 'done':
+            status['cid'] = self.cid
+            status['cids'] = self.cids
+
+        if self.error:
+            status['error'] = self.error
+
+        return status
+
+class PinQueue:
+    """Runs pin jobs on a bounded pool of PIN_WORKERS threads.
+
+    A request for a path that is already queued or running joins the job in
+    flight, unless it streams, since a stream has to see every entry from the
+    start. Finished jobs are kept for PIN_JOB_TTL seconds so their status
+    can still be read.
+    """
+
+    def __init__(self):
+        self.workers = int(os.environ.get('PIN_WORKERS', 2))
+        self.ttl = int(os.environ.get('PIN_JOB_TTL', 3600))
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.active = {}
+        self.lock = Lock()
+
+        for i in range(self.workers):
+            Thread(target=self.work, name=f'pinner-{i}', daemon=True).start()
+
+    def submit(self, path, stream=False):
+        path = os.path.normpath(path)
+
+        with self.lock:
+            self.prune()
+
+            job = None if stream else self.active.get(path)
+
+            if not job:
+                job = PinJob(path, stream)
+                self.jobs[job.id] = job
+                if not stream:
+                    self.active[path] = job
+                self.queue.put(job)
+
+        return job
+
+    def get(self, id):
+        with self.lock:
+            return self.jobs.get(id)
+
+    def watch(self, jobs):
+        """Yield the given jobs in the order they finish."""
+        finished = queue.Queue()
+
+        with self.lock:
+            for job in jobs:
+                if job.finished:
+                    finished.put(job)
+                else:
+                    job.watchers.append(finished)
+
+        for _ in jobs:
+            yield finished.get()
+
+    def prune(self):
+        expired = time.time() - self.ttl
+
+        for id, job in list(self.jobs.items()):
+            if job.finished and job.finished < expired:
+                del self.jobs[id]
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            self.run(job)
+
+    def run(self, job):
+        job.state = 'running'
+
+        try:
+            if checkIpfs():
+                with ipfsClient() as ipfs:
+                    if job.stream:
+                        # The entries go straight to the reader and are not kept
+                        job.cid = pinning.pinStream(ipfs, job.path, job.emit, job.progress, job.scanned)
+                    else:
+                        pins = pinning.pinFolder(ipfs, job.path, job.progress, job.scanned)
+                        job.cid = pins[-1]['Hash']
+                        job.cids = [{ 'name': pin['Name'], 'cid': pin['Hash']} for pin in pins]
+
+                job.state = 'done'
+                print(f"pinned {job.path} to {job.cid}")
+            else:
+                print("IPFS not available")
+                job.error = 'IPFS not available'
+        except IPFSError as error:
+            print(f"Failed to pin data {job.path}: {str(error)}")
+            job.error = f"Failed to pin data: {str(error)}"
+        except Exception as error:
+            print(f"An unexpected error occurred: {str(error)}")
+            job.error = f"An unexpected error occurred: {str(error)}"
+
+        if job.error:
+            job.state = 'failed'
+
+        with self.lock:
+            if self.active.get(job.path) is job:
+                del self.active[job.path]
+            job.finished = time.time()
+            for watcher in job.watchers:
+                watcher.put(job)
+
+        job.finish()
+
+pinQueue = PinQueue()
@@ -0,0 +1,251 @@
+import os
+import json
+import uuid
+import hashlib
+
+from threading import Lock
+from ipfs import IPFSError
+from store import openStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    cid TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256, size);
+DROP TABLE IF EXISTS folders;
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    links TEXT NOT NULL
+);
+"""
+
+class PinManifest:
+    """Persistent record of what has already been added to IPFS.
+
+    files maps a path and its (size, mtime, sha256) to the file's CID, and
+    dirs maps a directory and a fingerprint of its contents to the
+    directory CID plus the (name, cid) links of its direct children.
+    """
+
+    def __init__(self):
+        self.db = openStore('pins.db', SCHEMA)
+        self.lock = Lock()
+
+    def getFile(self, path):
+        with self.lock:
+            return self.db.execute('SELECT * FROM files WHERE path = ?', (path,)).fetchone()
+
+    def findContent(self, sha256, size):
+        with self.lock:
+            row = self.db.execute('SELECT cid FROM files WHERE sha256 = ? AND size = ?', (sha256, size)).fetchone()
+        return row['cid'] if row else None
+
+    def getFolder(self, path):
+        with self.lock:
+            return self.db.execute('SELECT * FROM dirs WHERE path = ?', (path,)).fetchone()
+
+    def forget(self, path):
+        """Drop what is recorded for path and everything below it."""
+        below = path.rstrip('/') + '/%'
+
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM files WHERE path = ? OR path LIKE ?', (path, below))
+            self.db.execute('DELETE FROM dirs WHERE path = ? OR path LIKE ?', (path, below))
+
+    def save(self, files, dirs):
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', files)
+            self.db.executemany('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)', dirs)
+
+manifest = PinManifest()
+
+class Node():
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.files = []
+        self.dirs = []
+        self.fingerprint = None
+
+def scan(path):
+    """Stat a directory tree (without reading any file) and fingerprint it.
+
+    Like `ipfs add` with pattern "**", dot-files and symlinks are skipped.
+    """
+    node = Node(path)
+    digest = hashlib.sha256()
+
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.name.startswith('.') or entry.is_symlink():
+                continue
+            if entry.is_dir():
+                node.dirs.append(scan(entry.path))
+            elif entry.is_file():
+                stat = entry.stat()
+                node.files.append((entry.name, entry.path, stat.st_size, stat.st_mtime_ns))
+
+    for name, _, size, mtime in node.files:
+        digest.update(f"f {name} {size} {mtime}\n".encode())
+
+    for child in node.dirs:
+        digest.update(f"d {child.name} {child.fingerprint}\n".encode())
+
+    node.fingerprint = digest.hexdigest()
+    return node
+
+def hashFile(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def countFiles(node):
+    return len(node.files) + sum(countFiles(child) for child in node.dirs)
+
+class Pinner():
+    def __init__(self, ipfs, progress=None, emit=None, fresh=False):
+        self.ipfs = ipfs
+        self.progress = progress
+        self.emit = emit
+        self.fresh = fresh
+        self.cached = False
+        self.files = []
+        self.dirs = []
+
+    def report(self, files, hashed):
+        if self.progress:
+            self.progress(files, hashed)
+
+    def resolved(self, name, cid):
+        if self.emit:
+            self.emit(name, cid)
+
+    def fileCid(self, path, size, mtime):
+        row = None if self.fresh else manifest.getFile(path)
+
+        if row and row['size'] == size and row['mtime'] == mtime:
+            self.cached = True
+            self.report(1, 0)
+            return row['cid']
+
+        sha256 = hashFile(path)
+        cid = None if self.fresh else manifest.findContent(sha256, size)
+
+        if cid:
+            self.cached = True
+        else:
+            cid = self.ipfs.add(path, pin=False)['Hash']
+
+        self.files.append((path, size, mtime, sha256, cid))
+        self.report(1, size)
+        return cid
+
+    def makeDir(self, links):
+        """Build a unixfs directory from existing child CIDs in a scratch MFS folder."""
+        tmp = f"/artx-pins/{uuid.uuid4()}"
+        self.ipfs.files.mkdir(tmp, parents=True)
+        try:
+            for name, cid in sorted(links):
+                self.ipfs.files.cp(f"/ipfs/{cid}", f"{tmp}/{name}")
+            return self.ipfs.files.stat(tmp)['Hash']
+        finally:
+            self.ipfs.files.rm(tmp, recursive=True)
+
+    def build(self, node, prefix):
+        """Return the directory CID, emitting each entry below it, named from
+        prefix, as soon as its CID is known.
+
+        The directory's own entry comes last, matching the order of `ipfs add`
+        results. Only the links of each directory are kept, so streaming a
+        large tree doesn't hold the list of everything in it.
+        """
+        cached = None if self.fresh else manifest.getFolder(node.path)
+
+        if cached and cached['fingerprint'] == node.fingerprint:
+            self.cached = True
+            return self.replay(node, prefix, cached)
+
+        links = []
+
+        for name, path, size, mtime in node.files:
+            cid = self.fileCid(path, size, mtime)
+            links.append((name, cid))
+            self.resolved(f"{prefix}/{name}", cid)
+
+        for child in node.dirs:
+            links.append((child.name, self.build(child, f"{prefix}/{child.name}")))
+
+        cid = self.makeDir(links)
+        self.resolved(prefix, cid)
+
+        self.dirs.append((node.path, node.fingerprint, cid, json.dumps(links)))
+        return cid
+
+    def replay(self, node, prefix, cached):
+        """Emit a directory whose contents haven't changed from its recorded links."""
+        links = dict(json.loads(cached['links']))
+
+        self.report(len(node.files), 0)
+        for name, *_ in node.files:
+            self.resolved(f"{prefix}/{name}", links[name])
+
+        # Each child directory has its own record, with an unchanged fingerprint too
+        for child in node.dirs:
+            self.build(child, f"{prefix}/{child.name}")
+
+        self.resolved(prefix, cached['cid'])
+        return cached['cid']
+
+def pinStream(ipfs, folder, emit, progress=None, scanned=None):
+    """Pin a folder, only adding files that changed since it was last pinned.
+
+    emit(name, cid) is called for each entry as soon as its CID is known, in
+    the same order as `ipfs add` reports them, ending with the folder itself.
+    Returns the folder's CID once it is pinned. progress(files, bytes) is
+    called as files are resolved, with the number of bytes that had to be
+    hashed, and scanned(total) once the number of files is known.
+
+    If a pin that reused recorded CIDs fails, the node may have lost their
+    blocks (a new IPFS volume, or a GC). The folder's records are then
+    dropped and everything is added again from disk, so entries may be
+    emitted twice.
+    """
+    folder = os.path.normpath(folder)
+    node = scan(folder)
+    pinner = Pinner(ipfs, progress, emit)
+
+    if scanned:
+        scanned(countFiles(node))
+
+    try:
+        cid = pinner.build(node, node.name)
+        ipfs.pin.add(cid)
+    except IPFSError as error:
+        if not pinner.cached:
+            raise
+
+        print(f"Recorded CIDs for {folder} may be gone from IPFS, adding it again: {str(error)}")
+        manifest.forget(folder)
+        pinner = Pinner(ipfs, progress, emit, fresh=True)
+        cid = pinner.build(node, node.name)
+        ipfs.pin.add(cid)
+
+    # Only record CIDs once they are pinned, so a cached CID can't have been garbage collected
+    manifest.save(pinner.files, pinner.dirs)
+
+    return cid
+
+def pinFolder(ipfs, folder, progress=None, scanned=None):
+    """Like pinStream, but returns the same {'Name', 'Hash'} list as `ipfs.add(folder, recursive=True)`."""
+    # Keyed by name, since a retry emits the entries again
+    pins = {}
+    pinStream(ipfs, folder, pins.__setitem__, progress, scanned)
+    return [{'Name': name, 'Hash': cid} for name, cid in pins.items()]
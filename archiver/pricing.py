@@ -0,0 +1,132 @@
+import os
+import time
+import requests
+
+from threading import Lock, Thread
+
+COINGECKO_URL = 'https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd'
+
+def coingecko():
+    # PRICE_URL can point at any service answering in CoinGecko's format, e.g. a local stand-in
+    url = os.environ.get('PRICE_URL', COINGECKO_URL)
+    timeout = int(os.environ.get('PRICE_TIMEOUT', 5))
+    rates = requests.get(url, timeout=timeout).json()
+    return rates['bitcoin']['usd']
+
+class RateCache:
+    """BTC/USD exchange rate, cached with stale-while-revalidate.
+
+    A rate younger than PRICE_TTL seconds is served as is. Up to PRICE_GRACE
+    seconds past that it is still served while a background thread fetches a
+    new one. Only an older rate makes the caller wait on the source, and if
+    the source is down the old rate is used anyway.
+    """
+
+    def __init__(self, source=coingecko):
+        self.source = source
+        self.ttl = int(os.environ.get('PRICE_TTL', 300))
+        self.grace = int(os.environ.get('PRICE_GRACE', 3600))
+        self.rate = None
+        self.fetched = None
+        self.refreshing = False
+        self.lock = Lock()
+
+    def get(self):
+        with self.lock:
+            age = time.time() - self.fetched if self.fetched else None
+
+            if age is not None and age < self.ttl:
+                return self.rate
+
+            stale = age is not None and age < self.ttl + self.grace
+
+        if stale:
+            self.prefetch()
+            return self.rate
+
+        try:
+            return self.refresh()
+        except Exception as e:
+            # An outdated rate beats failing the caller during a source outage
+            if self.rate is None:
+                raise
+            print(f"exchange rate refresh failed, using rate from {int(age)}s ago: {str(e)}")
+            return self.rate
+
+    def prefetch(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        Thread(target=self.refreshInBackground, daemon=True).start()
+
+    def refresh(self):
+        rate = self.source()
+
+        with self.lock:
+            self.rate = rate
+            self.fetched = time.time()
+
+        return rate
+
+    def refreshInBackground(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"exchange rate refresh failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+class FeeCache:
+    """Fee estimates keyed by confirmation target and block height.
+
+    An estimate only changes when a block arrives, so the height is polled
+    at most every BTC_HEIGHT_TTL seconds and estimatesmartfee is only called
+    for a target not yet seen at the current height.
+    """
+
+    def __init__(self):
+        self.heightTtl = int(os.environ.get('BTC_HEIGHT_TTL', 15))
+        self.height = None
+        self.checked = None
+        self.fees = {}
+        self.lock = Lock()
+
+    def currentHeight(self, getHeight):
+        with self.lock:
+            if self.checked and time.time() - self.checked < self.heightTtl:
+                return self.height
+
+        height = getHeight()
+
+        with self.lock:
+            self.height = height
+            self.checked = time.time()
+
+        return height
+
+    def get(self, blocks, getHeight, estimate):
+        key = (blocks, self.currentHeight(getHeight))
+
+        with self.lock:
+            if key in self.fees:
+                return self.fees[key]
+
+        fee = estimate(blocks)
+
+        with self.lock:
+            # Estimates for older heights are no use any more
+            self.fees = {k: v for k, v in self.fees.items() if k[1] == key[1]}
+            self.fees[key] = fee
+
+        return fee
+
+    def invalidate(self):
+        with self.lock:
+            self.checked = None
+            self.fees = {}
+
+rates = RateCache()
+fees = FeeCache()
@@ -0,0 +1,141 @@
+import os
+import time
+
+from datetime import datetime
+from git.exc import GitCommandError
+from threading import Condition, Thread
+
+class PushScheduler:
+    """Pushes the data repo to its remote from a background thread.
+
+    Each commit schedules a push that waits for PUSH_DEBOUNCE seconds without
+    new commits, so a burst of commits goes out in one push. A steady stream
+    is still pushed at least every PUSH_MAX_DELAY seconds. A failed push is
+    retried after PUSH_BACKOFF seconds, doubling up to PUSH_BACKOFF_MAX.
+
+    git push only reads refs and objects, so it never takes the commit lock
+    and a slow remote can't hold up commits.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.debounce = float(os.environ.get('PUSH_DEBOUNCE', 5))
+        self.maxDelay = float(os.environ.get('PUSH_MAX_DELAY', 60))
+        self.backoff = float(os.environ.get('PUSH_BACKOFF', 5))
+        self.maxBackoff = float(os.environ.get('PUSH_BACKOFF_MAX', 300))
+        self.cond = Condition()
+        self.dirty = False
+        self.urgent = False
+        self.firstChange = None
+        self.lastChange = None
+        self.retryAt = None
+        self.failures = 0
+        self.lastPush = None
+        self.lastDuration = None
+        self.lastError = None
+        self.pushing = False
+        Thread(target=self.run, name='pusher', daemon=True).start()
+
+    def schedule(self, *args):
+        """Push soon; also usable as a committer listener."""
+        with self.cond:
+            now = time.time()
+            if not self.dirty:
+                self.firstChange = now
+            self.dirty = True
+            self.lastChange = now
+            self.cond.notify()
+
+    def pushNow(self):
+        """Push without waiting out the debounce, e.g. when asked to by /api/v1/push."""
+        with self.cond:
+            self.schedule()
+            self.urgent = True
+            self.cond.notify()
+
+    def due(self):
+        if self.urgent:
+            due = time.time()
+        else:
+            due = min(self.lastChange + self.debounce, self.firstChange + self.maxDelay)
+        # A retry waits out its backoff even if asked to push now
+        return max(due, self.retryAt or 0)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if not self.dirty:
+                        self.cond.wait()
+                        continue
+                    delay = self.due() - time.time()
+                    if delay <= 0:
+                        break
+                    self.cond.wait(delay)
+                self.dirty = False
+                self.urgent = False
+                self.pushing = True
+
+            try:
+                self.push()
+            finally:
+                with self.cond:
+                    self.pushing = False
+
+    def push(self):
+        if not self.repo.remotes:
+            self.lastError = 'No remote configured'
+            return
+
+        if self.ahead() == 0:
+            return
+
+        start = time.time()
+
+        try:
+            self.repo.git.push()
+        except GitCommandError as error:
+            self.failed(error)
+            return
+
+        self.lastDuration = time.time() - start
+        self.lastPush = start
+        self.lastError = None
+        print(f'git push successful in {self.lastDuration} seconds')
+
+        with self.cond:
+            self.failures = 0
+            self.retryAt = None
+
+    def failed(self, error):
+        with self.cond:
+            delay = min(self.backoff * 2 ** self.failures, self.maxBackoff)
+            self.failures += 1
+            self.retryAt = time.time() + delay
+            self.lastError = str(error)
+            # Retry even if nothing else gets committed meanwhile
+            self.schedule()
+
+        print(f'Failed to push changes, retrying in {delay} seconds: {str(error)}')
+
+    def ahead(self):
+        """Commits on HEAD that no remote-tracking branch has yet."""
+        try:
+            return int(self.repo.git.rev_list('--count', 'HEAD', '--not', '--remotes'))
+        except GitCommandError:
+            return None
+
+    def status(self):
+        with self.cond:
+            status = {
+                'pending': self.dirty,
+                'pushing': self.pushing,
+                'failures': self.failures,
+                'retryAt': datetime.fromtimestamp(self.retryAt).astimezone().isoformat() if self.retryAt else None,
+                'lastPush': datetime.fromtimestamp(self.lastPush).astimezone().isoformat() if self.lastPush else None,
+                'lastDuration': self.lastDuration,
+                'lastError': self.lastError,
+            }
+
+        status['ahead'] = self.ahead()
+        return status
@@ -0,0 +1,87 @@
+import struct
+
+class RawTx:
+    """The parts of a serialized transaction we use: input outpoints and output values and scripts.
+
+    Amounts are in satoshis and scripts are bytes; witnesses, input scripts
+    and everything else are skipped rather than kept.
+    """
+
+    __slots__ = ('inputs', 'outputs')
+
+    def __init__(self, inputs, outputs):
+        self.inputs = inputs
+        self.outputs = outputs
+
+class Reader:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        if self.pos + n > len(self.data):
+            raise ValueError('truncated transaction')
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def skip(self, n):
+        self.read(n)
+
+    def uint32(self):
+        return struct.unpack('<I', self.read(4))[0]
+
+    def uint64(self):
+        return struct.unpack('<Q', self.read(8))[0]
+
+    def varint(self):
+        n = self.read(1)[0]
+        if n == 0xfd:
+            return struct.unpack('<H', self.read(2))[0]
+        if n == 0xfe:
+            return self.uint32()
+        if n == 0xff:
+            return self.uint64()
+        return n
+
+def decodeRawTx(hexdata):
+    """Decode the hex that getrawtransaction returns at verbosity 0."""
+    reader = Reader(bytes.fromhex(hexdata))
+    reader.skip(4) # version
+
+    count = reader.varint()
+    segwit = count == 0
+
+    if segwit:
+        # BIP 144: a zero marker byte and a flag byte, then the real input count
+        if reader.read(1)[0] == 0:
+            raise ValueError('bad segwit flag')
+        count = reader.varint()
+
+    inputs = []
+    for _ in range(count):
+        txid = reader.read(32)[::-1].hex()
+        vout = reader.uint32()
+        reader.skip(reader.varint()) # scriptSig
+        reader.skip(4) # sequence
+        inputs.append((txid, vout))
+
+    outputs = []
+    for _ in range(reader.varint()):
+        value = reader.uint64()
+        script = reader.read(reader.varint())
+        outputs.append((value, script))
+
+    if segwit:
+        for _ in inputs:
+            for _ in range(reader.varint()):
+                reader.skip(reader.varint())
+
+    reader.skip(4) # locktime
+
+    if reader.pos != len(reader.data):
+        raise ValueError('trailing data after transaction')
+
+    return RawTx(inputs, outputs)
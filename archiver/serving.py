@@ -0,0 +1,121 @@
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import wraps
+from threading import BoundedSemaphore, Lock
+from flask import Response, copy_current_request_context, jsonify
+
+class Bulkhead:
+    """Isolates the routes that depend on one backend (ipfs, bitcoin, git...).
+
+    At most ARC_<NAME>_LIMIT of them run at once, each on the bulkhead's own
+    threads, so a stuck backend can tie up only its own slots and never the
+    server threads that other routes such as /commit and /ready need. A request
+    that finds no free slot within ARC_<NAME>_TIMEOUT seconds gets a 503; one
+    that doesn't finish in that time gets a 504. A timed-out call keeps its
+    slot until it really returns, so the backend is never sent more than the
+    limit.
+
+    Routes that spend (see spends) only time out waiting for a slot. Once
+    running they are waited for to the end, because a 504 would hide a
+    transaction that may still be broadcast.
+
+    A route that returns a streamed Response keeps its slot until the server
+    closes the stream, since the work goes on as the stream is read.
+    """
+
+    def __init__(self, name, limit, timeout):
+        key = name.upper()
+        self.name = name
+        self.limit = int(os.environ.get(f'ARC_{key}_LIMIT', limit))
+        self.timeout = float(os.environ.get(f'ARC_{key}_TIMEOUT', timeout))
+        self.slots = BoundedSemaphore(self.limit)
+        self.executor = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix=f'route-{name}')
+
+    def __call__(self, fn):
+        return self.guard(fn, timed=True)
+
+    def spends(self, fn):
+        return self.guard(fn, timed=False)
+
+    def guard(self, fn, timed):
+        @wraps(fn)
+        def guarded(*args, **kwargs):
+            deadline = time.time() + self.timeout
+
+            if not self.slots.acquire(timeout=self.timeout):
+                print(f"{self.name} bulkhead full, rejecting {fn.__name__}")
+                return jsonify({'error': f'{self.name} busy, try again later'}), 503
+
+            try:
+                future = self.executor.submit(copy_current_request_context(fn), *args, **kwargs)
+            except:
+                self.slots.release()
+                raise
+
+            slot = Slot(self.slots)
+            future.add_done_callback(slot.done)
+
+            try:
+                response = future.result(timeout=max(0, deadline - time.time()) if timed else None)
+            except TimeoutError:
+                print(f"{fn.__name__} timed out after {self.timeout}s")
+                slot.abandon()
+                return jsonify({'error': f'{self.name} timed out'}), 504
+
+            if streamed(response):
+                response.call_on_close(self.slots.release)
+            return response
+
+        return guarded
+
+def streamed(response):
+    return isinstance(response, Response) and response.is_streamed
+
+class Slot:
+    """Releases a bulkhead slot when its route returns, unless the route
+    streams. The request thread then hands the release to the stream's
+    close, or, if it gave up waiting, the stream is closed here unread.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.lock = Lock()
+        self.abandoned = False
+        self.response = None
+
+    def done(self, future):
+        response = None if future.cancelled() or future.exception() else future.result()
+
+        with self.lock:
+            if streamed(response) and not self.abandoned:
+                self.response = response
+                return
+
+        self.release(response)
+
+    def abandon(self):
+        with self.lock:
+            self.abandoned = True
+            response = self.response
+
+        if response:
+            self.release(response)
+
+    def release(self, response):
+        if streamed(response):
+            response.close()
+        self.slots.release()
+
+def serve(app, port):
+    """Serve app with waitress on ARC_THREADS threads, or with Flask's debug server if ARC_DEBUG is set."""
+    if os.environ.get('ARC_DEBUG'):
+        app.run(debug=True, host='0.0.0.0', port=port)
+        return
+
+    from waitress import serve as waitress
+
+    threads = int(os.environ.get('ARC_THREADS', 32))
+    print(f"serving on port {port} with {threads} threads")
+    waitress(app, host='0.0.0.0', port=port, threads=threads)
@@ -0,0 +1,19 @@
+import os
+import sqlite3
+
+def storePath(name):
+    folder = os.environ.get('ARC_STORE', 'store')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+def openStore(name, schema):
+    """Open (and create if needed) a sqlite database under ARC_STORE.
+
+    The connection may be used from any thread; callers serialize access
+    with their own lock.
+    """
+    db = sqlite3.connect(storePath(name), check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(schema)
+    return db
@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+from git import Repo
+
+# The archiver runs from its own folder and imports its modules flat
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules open their sqlite stores on import, so point them somewhere disposable first
+os.environ['ARC_STORE'] = tempfile.mkdtemp(prefix='arc-store-')
+
+def makeRepo(path):
+    repo = Repo.init(path)
+    with repo.config_writer() as config:
+        config.set_value('user', 'name', 'ArtX Test')
+        config.set_value('user', 'email', 'test@artx.market')
+    return repo
+
+@pytest.fixture
+def repo(tmp_path):
+    return makeRepo(tmp_path / 'data')
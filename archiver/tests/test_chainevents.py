@@ -0,0 +1,83 @@
+import time
+
+from threading import Thread
+
+import pytest
+
+zmq = pytest.importorskip('zmq')
+
+import chainevents
+
+from test_rawtx import serialize
+
+class Wallet:
+    """Stands in for the Authorizer's wallet state."""
+
+    def __init__(self, outpoints):
+        self.outpoints = frozenset(outpoints)
+        self.invalidated = 0
+
+    def invalidateWallet(self):
+        self.invalidated += 1
+
+    def certifyMany(self, txids):
+        return {txid: {'status': 'pending'} for txid in txids}
+
+@pytest.fixture
+def publisher():
+    """A ZMQ PUB socket standing in for bitcoind's -zmqpubhashblock/-zmqpubrawtx."""
+    socket = zmq.Context.instance().socket(zmq.PUB)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    yield socket, f'tcp://127.0.0.1:{port}'
+    socket.close(linger=0)
+
+@pytest.fixture
+def events(publisher, monkeypatch):
+    socket, endpoint = publisher
+    monkeypatch.setenv('BTC_ZMQ', endpoint)
+    events = chainevents.ChainEvents()
+    Thread(target=events.subscribe, daemon=True).start()
+    return events
+
+def publishUntil(socket, topic, body, condition, timeout=10):
+    # A new subscriber misses whatever is sent before it has connected
+    deadline = time.time() + timeout
+    sequence = 0
+    while time.time() < deadline:
+        socket.send_multipart([topic, body, sequence.to_bytes(4, 'little')])
+        sequence += 1
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_hashblock_wakes_the_block_loop(publisher, events):
+    socket, _ = publisher
+    blockhash = 'ab' * 32
+
+    assert publishUntil(socket, b'hashblock', bytes.fromhex(blockhash), events.newBlock.is_set)
+    assert events.lastBlock == blockhash
+
+def test_rawtx_spending_our_outputs_invalidates_the_wallet(publisher, events, monkeypatch):
+    socket, _ = publisher
+    wallet = Wallet({('11' * 32, 1)})
+    monkeypatch.setattr(chainevents.authorizer, 'getAuthorizer', lambda: wallet)
+
+    other = bytes.fromhex(serialize([('22' * 32, 0)], [(1000, b'\x51')], True))
+    ours = bytes.fromhex(serialize([('11' * 32, 1)], [(1000, b'\x51')], True))
+
+    for _ in range(5):
+        socket.send_multipart([b'rawtx', other, b'\x00' * 4])
+
+    assert publishUntil(socket, b'rawtx', ours, lambda: wallet.invalidated)
+
+def test_results_wake_waiters(monkeypatch):
+    monkeypatch.setattr(chainevents.authorizer, 'getAuthorizer', lambda: Wallet([]))
+    events = chainevents.ChainEvents()
+    txid = 'cd' * 32
+    events.watch(txid)
+
+    result = {'status': 'certified', 'cert': {'xid': 'x'}}
+    Thread(target=lambda: (time.sleep(0.1), events.publish({txid: result}))).start()
+
+    assert events.wait(txid, 5) == result
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from coinselect import CoinSelector
+
+def utxo(n, amount):
+    return {'txid': f'{n:064x}', 'vout': 0, 'amount': Decimal(amount)}
+
+FUNDS = [utxo(1, '0.001'), utxo(2, '0.005'), utxo(3, '0.02'), utxo(4, '0.0004')]
+
+def test_smallest_single_covering_input():
+    assert CoinSelector.choose(FUNDS, Decimal('0.004'), Decimal('0.0001')) == [FUNDS[1]]
+
+def test_largest_first_when_no_single_input_covers():
+    chosen = CoinSelector.choose(FUNDS, Decimal('0.0255'), Decimal('0'))
+
+    assert chosen == [FUNDS[2], FUNDS[1], FUNDS[0]]
+
+def test_each_extra_input_adds_its_cost():
+    # 0.02 + 0.005 covers 0.0249, but not once the second input's cost is added
+    chosen = CoinSelector.choose(FUNDS, Decimal('0.0249'), Decimal('0.0002'))
+
+    assert chosen == [FUNDS[2], FUNDS[1], FUNDS[0]]
+
+def test_not_enough_funds():
+    assert CoinSelector.choose(FUNDS, Decimal('1'), Decimal('0')) is None
+
+def test_reserved_inputs_are_not_offered_again():
+    coins = CoinSelector()
+
+    first = coins.select(FUNDS, Decimal('0.004'))
+    second = coins.select(FUNDS, Decimal('0.004'))
+
+    assert first == [FUNDS[1]]
+    assert second == [FUNDS[2]]
+
+    coins.release(first)
+    assert coins.select(FUNDS, Decimal('0.004')) == [FUNDS[1]]
+
+def test_sync_ends_reservations_of_spent_inputs():
+    coins = CoinSelector()
+    spent = coins.select(FUNDS, Decimal('0.004'))
+
+    coins.sync(FUNDS)
+    assert coins.select(FUNDS, Decimal('0.004')) != spent
+
+    coins.sync([fund for fund in FUNDS if fund not in spent])
+    assert coins.reserved.keys() == {('%064x' % 3, 0)}
@@ -0,0 +1,81 @@
+from threading import Thread
+
+import pytest
+
+from committer import GroupCommitter, RepoLock
+
+@pytest.fixture
+def committer(repo, monkeypatch):
+    monkeypatch.setenv('COMMIT_WINDOW', '200')
+    monkeypatch.setenv('COMMIT_RECONCILE', '0')
+    return GroupCommitter(repo, RepoLock(repo))
+
+def write(repo, name, text='x'):
+    path = f'{repo.working_tree_dir}/{name}'
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+def test_concurrent_commits_share_one_commit(repo, committer):
+    githashes = {}
+
+    def commit(i):
+        write(repo, f'file{i}')
+        githashes[i] = committer.commit(f'event {i}')
+
+    threads = [Thread(target=commit, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(githashes.values())) == 1
+    assert sorted(repo.head.commit.message.splitlines()) == [f'event {i}' for i in range(5)]
+    assert sorted(item.path for item in repo.head.commit.tree.traverse()) == [f'file{i}' for i in range(5)]
+
+def test_batch_size_is_capped(repo, monkeypatch):
+    monkeypatch.setenv('COMMIT_WINDOW', '200')
+    monkeypatch.setenv('COMMIT_RECONCILE', '0')
+    monkeypatch.setenv('COMMIT_BATCH', '2')
+    committer = GroupCommitter(repo, RepoLock(repo))
+
+    threads = [Thread(target=committer.commit, args=(f'event {i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [len(commit.message.splitlines()) for commit in repo.iter_commits()] == [2, 2]
+
+def test_only_named_paths_are_staged(repo, committer):
+    staged = write(repo, 'staged')
+    write(repo, 'left')
+
+    committer.commit('partial', [staged])
+
+    assert [item.path for item in repo.head.commit.tree.traverse()] == ['staged']
+    assert repo.untracked_files == ['left']
+
+def test_paths_outside_the_repo_stage_everything(repo, committer, tmp_path):
+    write(repo, 'one')
+    write(repo, 'two')
+
+    committer.commit('outside', [str(tmp_path / 'elsewhere')])
+
+    assert sorted(item.path for item in repo.head.commit.tree.traverse()) == ['one', 'two']
+
+def test_listeners_see_each_commit(repo, committer):
+    seen = []
+    committer.listeners.append(lambda githash, messages: seen.append((githash, messages)))
+
+    githash = committer.commit('noted')
+
+    assert seen == [(githash, ['noted'])]
+    assert committer.flushStats()['commits'] == 1
+
+def test_empty_commit_still_gets_a_githash(repo, committer):
+    first = committer.commit('first')
+    second = committer.commit('second')
+
+    assert first != second
+    assert repo.head.commit.hexsha == second
@@ -0,0 +1,108 @@
+import json
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from eventlog import EventLog
+
+@pytest.fixture
+def events(tmp_path, monkeypatch):
+    monkeypatch.setenv('ARC_STORE', str(tmp_path / 'store'))
+    return EventLog()
+
+def event(type, agent='agent-1', asset='asset-1', **fields):
+    return json.dumps({'type': type, 'agent': agent, 'asset': asset, **fields})
+
+def commit(repo, *messages):
+    repo.git.commit('--allow-empty', '-m', '\n'.join(messages))
+    return repo.head.commit.hexsha
+
+def test_events_come_back_newest_first(events):
+    events.append('a' * 40, [event('mint', n=1)])
+    events.append('b' * 40, [event('list', n=2), event('sell', n=3)])
+
+    logs, next = events.query()
+
+    assert [log['n'] for log in logs] == [3, 2, 1]
+    assert logs[0]['hash'] == 'bbbbbbb'
+    assert logs[0]['date']
+    assert next is None
+
+def test_pages_follow_the_cursor(events):
+    for n in range(5):
+        events.append(f'{n:040x}', [event('mint', n=n)])
+
+    pages = []
+    cursor = None
+    while True:
+        logs, cursor = events.query(cursor=cursor, limit=2)
+        pages.append([log['n'] for log in logs])
+        if cursor is None:
+            break
+
+    assert pages == [[4, 3], [2, 1], [0]]
+
+def test_filters(events):
+    events.append('a' * 40, [event('mint', agent='alice', asset='one'),
+                             event('sell', agent='bob', asset='one'),
+                             event('mint', agent='bob', asset='two')])
+
+    assert len(events.query(type='mint')[0]) == 2
+    assert len(events.query(agent='bob')[0]) == 2
+    assert [log['agent'] for log in events.query(type='mint', asset='two')[0]] == ['bob']
+    assert events.query(type='burn') == ([], None)
+
+def test_since_leaves_out_older_events(events):
+    now = datetime.now().astimezone()
+    events.append('a' * 40, [event('mint', n=1)], now - timedelta(days=10))
+    events.append('b' * 40, [event('mint', n=2)], now)
+
+    logs, _ = events.query(since=(now - timedelta(days=1)).timestamp())
+
+    assert [log['n'] for log in logs] == [2]
+
+def test_lines_that_are_not_events_are_skipped(events):
+    events.append('a' * 40, ['not json\n' + event('mint'), '[1, 2]', event('reconcile')])
+
+    assert [log['type'] for log in events.query()[0]] == ['mint']
+
+def test_backfill_imports_history_once(repo, events):
+    commit(repo, event('mint', n=1))
+    commit(repo, event('reconcile'))
+    githash = commit(repo, event('list', n=2), event('sell', n=3))
+
+    events.backfill(repo)
+    events.backfill(repo)
+
+    logs, _ = events.query()
+
+    assert [log['n'] for log in logs] == [3, 2, 1]
+    assert logs[0]['hash'] == githash[:7]
+
+def test_interrupted_backfill_is_redone_from_scratch(repo, events, monkeypatch):
+    for n in range(3):
+        commit(repo, event('mint', n=n))
+
+    parse = events.parse
+    def failing(githash, messages, date=None):
+        if 'n": 2' in messages[0]:
+            raise OSError('disk full')
+        return parse(githash, messages, date)
+
+    monkeypatch.setattr(events, 'parse', failing)
+    with pytest.raises(OSError):
+        events.backfill(repo)
+
+    assert events.query() == ([], None)
+
+    monkeypatch.setattr(events, 'parse', parse)
+    events.backfill(repo)
+
+    assert [log['n'] for log in events.query()[0]] == [2, 1, 0]
+
+def test_backfill_of_an_empty_repo(repo, events):
+    events.backfill(repo)
+
+    assert events.query() == ([], None)
+    assert events.db.execute("SELECT 1 FROM meta WHERE name = 'backfilled'").fetchone()
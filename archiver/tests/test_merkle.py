@@ -0,0 +1,64 @@
+import pytest
+
+from merkle import ROOT_TAG, buildTree, leafHash, merkleStore, nodeHash, parseRoot, rootScript, sha256, verifyProof
+
+def leaves(n):
+    return [sha256(bytes([i])) for i in range(n)]
+
+@pytest.mark.parametrize('n', range(1, 13))
+def test_every_proof_verifies(n):
+    hashes = leaves(n)
+    root, proofs = buildTree(hashes)
+
+    assert len(proofs) == n
+    assert all(verifyProof(leaf, proof, root) for leaf, proof in zip(hashes, proofs))
+
+def test_single_leaf_is_the_root():
+    [leaf] = leaves(1)
+
+    assert buildTree([leaf]) == (leaf, [[]])
+
+def test_odd_leaf_is_carried_up():
+    a, b, c = leaves(3)
+    root, proofs = buildTree([a, b, c])
+
+    assert root == nodeHash(nodeHash(a, b), c)
+    assert proofs[2] == [{'side': 'left', 'hash': nodeHash(a, b).hex()}]
+
+def test_wrong_leaf_or_proof_fails():
+    hashes = leaves(5)
+    root, proofs = buildTree(hashes)
+
+    assert not verifyProof(hashes[0], proofs[1], root)
+    assert not verifyProof(sha256(b'other'), proofs[0], root)
+
+def test_leaf_and_node_hashes_differ():
+    cid, xid58 = 'QmbNcW8SqNvJ7QuX5zQhQ7fgUtFK8W2gx7GnEgCsPaqGf4', '7acispnrqsPTgpBQe9cugX'
+
+    assert leafHash(cid, xid58) != sha256(f'{cid}::{xid58}'.encode())
+
+def test_root_script_round_trip():
+    root, _ = buildTree(leaves(4))
+    data = bytes.fromhex(rootScript(root))
+    script = (bytes([0x6a, len(data)]) + data).hex()
+    tx = {'vout': [{'scriptPubKey': {'type': 'nulldata', 'hex': script}}]}
+
+    assert len(data) == len(ROOT_TAG) + 32
+    assert parseRoot(tx) == root
+
+def test_single_pair_script_is_not_a_root():
+    op_return = b'QmbNcW8SqNvJ7QuX5zQhQ7fgUtFK8W2gx7GnEgCsPaqGf4::7acispnrqsPTgpBQe9cugX'
+    tx = {'vout': [{'scriptPubKey': {'type': 'nulldata', 'hex': (bytes([0x6a, len(op_return)]) + op_return).hex()}}]}
+
+    assert parseRoot(tx) is None
+
+def test_batch_is_saved_before_its_txid_is_known():
+    pairs = [('xid-a', 'cid-a'), ('xid-b', 'cid-b')]
+    root, proofs = buildTree(leaves(2))
+
+    merkleStore.save(root, pairs, proofs)
+    assert [(row['xid'], row['proof']) for row in merkleStore.getLeaves(root)] == [('xid-a', proofs[0]), ('xid-b', proofs[1])]
+
+    merkleStore.setTxid(root, 'ab' * 32)
+    row = merkleStore.db.execute('SELECT txid FROM roots WHERE root = ?', (root.hex(),)).fetchone()
+    assert row['txid'] == 'ab' * 32
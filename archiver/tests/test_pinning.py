@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+
+import pytest
+
+pytest.importorskip('ipfshttpclient')
+
+import pinning
+
+from ipfs import IPFSError
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+class Files:
+    """The MFS calls the Pinner builds directories with."""
+
+    def __init__(self, ipfs):
+        self.ipfs = ipfs
+        self.dirs = {}
+
+    def mkdir(self, path, parents=False):
+        self.dirs[path] = {}
+
+    def cp(self, source, dest):
+        cid = source.rsplit('/', 1)[-1]
+        if cid not in self.ipfs.blocks:
+            raise IPFSError(f'block {cid} not found')
+        folder, name = dest.rsplit('/', 1)
+        self.dirs[folder][name] = cid
+
+    def stat(self, path):
+        cid = self.ipfs.dirCid(self.dirs[path])
+        self.ipfs.blocks.add(cid)
+        return {'Hash': cid}
+
+    def rm(self, path, recursive=False):
+        del self.dirs[path]
+
+class Pin:
+    def __init__(self, ipfs):
+        self.ipfs = ipfs
+
+    def add(self, cid):
+        if cid not in self.ipfs.blocks:
+            raise IPFSError(f'block {cid} not found')
+        self.ipfs.pinned.append(cid)
+
+class Ipfs:
+    """Stands in for the IPFS client. A file's CID is a hash of its content
+    and a directory's a hash of its links, whether built by add or in MFS.
+    """
+
+    def __init__(self):
+        self.blocks = set()
+        self.added = []
+        self.pinned = []
+        self.files = Files(self)
+        self.pin = Pin(self)
+
+    def fileCid(self, path):
+        with open(path, 'rb') as f:
+            cid = 'Qf' + digest(f.read())
+        self.blocks.add(cid)
+        return cid
+
+    def dirCid(self, links):
+        cid = 'Qd' + digest(json.dumps(sorted(links.items())).encode())
+        self.blocks.add(cid)
+        return cid
+
+    def add(self, path, pin=True, recursive=False):
+        if not recursive:
+            self.added.append(path)
+            return {'Name': os.path.basename(path), 'Hash': self.fileCid(path)}
+
+        # Like ipfs add -r: every entry named from the folder, each directory after its contents
+        results = []
+
+        def walk(path, name):
+            links = {}
+            for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+                if entry.name.startswith('.') or entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    links[entry.name] = walk(entry.path, f'{name}/{entry.name}')
+                else:
+                    links[entry.name] = self.fileCid(entry.path)
+                    results.append({'Name': f'{name}/{entry.name}', 'Hash': links[entry.name]})
+            results.append({'Name': name, 'Hash': self.dirCid(links)})
+            return results[-1]['Hash']
+
+        walk(path, os.path.basename(path))
+        return results
+
+@pytest.fixture(autouse=True)
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setenv('ARC_STORE', str(tmp_path / 'store'))
+    manifest = pinning.PinManifest()
+    monkeypatch.setattr(pinning, 'manifest', manifest)
+    return manifest
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / 'asset'
+    for name, text in [('a.txt', 'a'), ('b.txt', 'b'), ('sub/c.txt', 'c'), ('sub/deep/d.txt', 'd'), ('.hidden', 'h')]:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return root
+
+def pins(results):
+    return {result['Name']: result['Hash'] for result in results}
+
+def test_cids_match_ipfs_add(folder):
+    ipfs = Ipfs()
+
+    results = pinning.pinFolder(ipfs, str(folder))
+
+    assert pins(results) == pins(ipfs.add(str(folder), recursive=True))
+    assert results[-1]['Name'] == 'asset'
+    assert ipfs.pinned == [results[-1]['Hash']]
+
+def test_cached_cids_match_too(folder):
+    ipfs = Ipfs()
+    first = pinning.pinFolder(ipfs, str(folder))
+    ipfs.added.clear()
+
+    second = pinning.pinFolder(ipfs, str(folder))
+
+    assert second == first
+    assert ipfs.added == []
+
+def test_stream_emits_each_directory_after_its_contents(folder):
+    emitted = []
+
+    cid = pinning.pinStream(Ipfs(), str(folder), lambda name, cid: emitted.append((name, cid)))
+
+    names = [name for name, _ in emitted]
+    assert emitted[-1] == ('asset', cid)
+    assert names.index('asset/sub/deep/d.txt') < names.index('asset/sub/deep') < names.index('asset/sub')
+
+def test_changed_size_adds_the_file_again(folder):
+    ipfs = Ipfs()
+    pinning.pinFolder(ipfs, str(folder))
+    ipfs.added.clear()
+
+    (folder / 'sub' / 'c.txt').write_text('longer')
+    results = pinning.pinFolder(ipfs, str(folder))
+
+    assert ipfs.added == [str(folder / 'sub' / 'c.txt')]
+    assert pins(results) == pins(ipfs.add(str(folder), recursive=True))
+
+def test_changed_mtime_rehashes_but_reuses_the_cid(folder):
+    ipfs = Ipfs()
+    pinning.pinFolder(ipfs, str(folder))
+    ipfs.added.clear()
+
+    path = folder / 'a.txt'
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    hashed = []
+    pinning.pinFolder(ipfs, str(folder), progress=lambda files, size: hashed.append(size))
+
+    assert sum(hashed) == path.stat().st_size
+    assert ipfs.added == []
+    assert pinning.manifest.getFile(str(path))['mtime'] == stat.st_mtime_ns + 10 ** 9
+
+def test_lost_blocks_are_added_again(folder):
+    ipfs = Ipfs()
+    first = pinning.pinFolder(ipfs, str(folder))
+
+    # A new IPFS volume, or a GC, loses every block the manifest points at
+    ipfs.blocks.clear()
+    ipfs.added.clear()
+    (folder / 'e.txt').write_text('e')
+
+    results = pinning.pinFolder(ipfs, str(folder))
+
+    # Everything is added again from disk, not just the new file
+    assert sorted(os.path.basename(path) for path in set(ipfs.added)) == ['a.txt', 'b.txt', 'c.txt', 'd.txt', 'e.txt']
+    assert pins(results) == pins(ipfs.add(str(folder), recursive=True))
+    assert pins(results)['asset/sub'] == pins(first)['asset/sub']
@@ -0,0 +1,81 @@
+import time
+
+from threading import Event
+
+import pytest
+
+from pricing import RateCache
+
+class Source:
+    """Stands in for the price service."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.calls = 0
+        self.down = False
+        self.gate = Event()
+        self.gate.set()
+
+    def __call__(self):
+        self.gate.wait(5)
+        self.calls += 1
+        if self.down:
+            raise ConnectionError('price source down')
+        return self.rate
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setenv('PRICE_TTL', '300')
+    monkeypatch.setenv('PRICE_GRACE', '3600')
+    source = Source(50000)
+    return RateCache(source), source
+
+def age(cache, seconds):
+    cache.fetched = time.time() - seconds
+
+def test_fresh_rate_is_served_from_cache(cache):
+    rates, source = cache
+
+    assert rates.get() == 50000
+    assert rates.get() == 50000
+    assert source.calls == 1
+
+def test_stale_rate_is_served_while_refreshing(cache):
+    rates, source = cache
+    rates.get()
+    source.rate = 60000
+    source.gate.clear()
+    age(rates, 400)
+
+    assert rates.get() == 50000
+
+    source.gate.set()
+    deadline = time.time() + 5
+    while rates.rate != 60000 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert rates.get() == 60000
+    assert source.calls == 2
+
+def test_expired_rate_waits_for_the_source(cache):
+    rates, source = cache
+    rates.get()
+    source.rate = 60000
+    age(rates, 5000)
+
+    assert rates.get() == 60000
+
+def test_old_rate_is_used_when_the_source_is_down(cache):
+    rates, source = cache
+    rates.get()
+    source.down = True
+    age(rates, 5000)
+
+    assert rates.get() == 50000
+
+def test_no_rate_at_all_raises(cache):
+    rates, source = cache
+    source.down = True
+
+    with pytest.raises(ConnectionError):
+        rates.get()
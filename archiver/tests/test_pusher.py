@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from git import Repo
+from pusher import PushScheduler
+
+def commit(repo, message):
+    repo.git.commit('--allow-empty', '-m', message)
+    return repo.head.commit.hexsha
+
+def waitFor(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+@pytest.fixture
+def remote(tmp_path, repo):
+    bare = Repo.init(tmp_path / 'remote.git', bare=True)
+    repo.create_remote('origin', bare.git_dir)
+    commit(repo, 'initial')
+    repo.git.push('-u', 'origin', 'HEAD')
+    return bare
+
+@pytest.fixture
+def pusher(repo, monkeypatch):
+    monkeypatch.setenv('PUSH_DEBOUNCE', '0.2')
+    monkeypatch.setenv('PUSH_MAX_DELAY', '1')
+    monkeypatch.setenv('PUSH_BACKOFF', '0.1')
+    return PushScheduler(repo)
+
+def test_burst_goes_out_in_one_push(repo, remote, pusher):
+    for i in range(3):
+        githash = commit(repo, f'event {i}')
+        pusher.schedule(githash, [f'event {i}'])
+
+    assert pusher.ahead() == 3
+    assert waitFor(lambda: pusher.ahead() == 0)
+    assert remote.head.commit.hexsha == githash
+    assert pusher.status()['lastError'] is None
+
+def test_push_now_skips_the_debounce(repo, remote, monkeypatch):
+    monkeypatch.setenv('PUSH_DEBOUNCE', '60')
+    monkeypatch.setenv('PUSH_MAX_DELAY', '60')
+    pusher = PushScheduler(repo)
+
+    githash = commit(repo, 'urgent')
+    pusher.pushNow()
+
+    assert waitFor(lambda: remote.head.commit.hexsha == githash)
+
+def test_failed_push_backs_off_and_retries(repo, remote, pusher, tmp_path):
+    repo.remotes.origin.set_url(str(tmp_path / 'missing.git'))
+
+    commit(repo, 'stuck')
+    pusher.schedule()
+
+    assert waitFor(lambda: pusher.status()['failures'] >= 2)
+    assert pusher.status()['lastError']
+
+    repo.remotes.origin.set_url(remote.git_dir)
+
+    assert waitFor(lambda: pusher.status()['failures'] == 0)
+    assert pusher.ahead() == 0
+
+def test_no_remote(repo, pusher):
+    commit(repo, 'local only')
+
+    pusher.push()
+
+    assert pusher.status()['lastError'] == 'No remote configured'
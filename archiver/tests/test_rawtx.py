@@ -0,0 +1,49 @@
+import struct
+
+import pytest
+
+from rawtx import decodeRawTx
+
+def varint(n):
+    if n < 0xfd:
+        return bytes([n])
+    return b'\xfd' + struct.pack('<H', n)
+
+def serialize(inputs, outputs, witness=False):
+    out = struct.pack('<I', 2)
+    if witness:
+        out += b'\x00\x01'
+    out += varint(len(inputs))
+    for txid, vout in inputs:
+        out += bytes.fromhex(txid)[::-1] + struct.pack('<I', vout) + varint(3) + b'\x01\x02\x03' + struct.pack('<I', 0xfffffffd)
+    out += varint(len(outputs))
+    for value, script in outputs:
+        out += struct.pack('<Q', value) + varint(len(script)) + script
+    if witness:
+        for _ in inputs:
+            out += varint(2) + varint(71) + b'\x30' * 71 + varint(33) + b'\x02' * 33
+    out += struct.pack('<I', 0)
+    return out.hex()
+
+INPUTS = [('11' * 32, 0), ('ab' * 31 + 'cd', 7)]
+OUTPUTS = [(0, b'\x6a\x04artx'), (1111, b'\x00\x14' + b'\x22' * 20), (997450, b'\x00\x14' + b'\x33' * 20)]
+
+@pytest.mark.parametrize('witness', [False, True])
+def test_decode(witness):
+    tx = decodeRawTx(serialize(INPUTS, OUTPUTS, witness))
+
+    assert tx.inputs == INPUTS
+    assert tx.outputs == OUTPUTS
+
+def test_many_outputs_use_a_long_varint():
+    outputs = [(i, b'\x51') for i in range(300)]
+
+    assert decodeRawTx(serialize(INPUTS, outputs)).outputs == outputs
+
+def test_truncated():
+    with pytest.raises(ValueError):
+        decodeRawTx(serialize(INPUTS, OUTPUTS, True)[:-10])
+
+def test_trailing_data():
+    with pytest.raises(ValueError):
+        decodeRawTx(serialize(INPUTS, OUTPUTS) + '00')
@@ -0,0 +1,59 @@
+import time
+
+from flask import Flask, Response
+
+from serving import Bulkhead
+
+def free(bulkhead):
+    return bulkhead.slots._value
+
+def waitFree(bulkhead, count, timeout=5):
+    # A plain route's slot is released by its future's callback, just after it returns
+    deadline = time.time() + timeout
+    while free(bulkhead) != count and time.time() < deadline:
+        time.sleep(0.01)
+    return free(bulkhead) == count
+
+def test_streaming_route_holds_its_slot_until_closed():
+    app = Flask(__name__)
+    bulkhead = Bulkhead('test', 2, 5)
+
+    @app.route('/stream')
+    @bulkhead
+    def stream():
+        return Response((f'{i}\n' for i in range(3)), mimetype='text/plain')
+
+    @app.route('/plain')
+    @bulkhead
+    def plain():
+        return 'done'
+
+    client = app.test_client()
+
+    assert client.get('/plain').data == b'done'
+    assert waitFree(bulkhead, 2)
+
+    response = client.get('/stream', buffered=False)
+    assert free(bulkhead) == 1
+
+    assert b''.join(response.response) == b'0\n1\n2\n'
+    response.close()
+    assert free(bulkhead) == 2
+
+def test_abandoned_stream_is_closed_and_released():
+    app = Flask(__name__)
+    bulkhead = Bulkhead('test', 1, 0.1)
+    closed = []
+
+    @app.route('/slow')
+    @bulkhead
+    def slow():
+        time.sleep(0.3)
+        response = Response(iter(['never read']))
+        response.call_on_close(lambda: closed.append(True))
+        return response
+
+    assert app.test_client().get('/slow').status_code == 504
+
+    assert waitFree(bulkhead, 1)
+    assert closed == [True]
@@ -0,0 +1,127 @@
+import time
+
+from threading import Lock
+from store import openStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS authtx (
+    txid TEXT PRIMARY KEY,
+    valid INTEGER NOT NULL,
+    cid TEXT,
+    xid TEXT,
+    xid58 TEXT,
+    op_return TEXT
+);
+CREATE TABLE IF NOT EXISTS xids (
+    xid TEXT PRIMARY KEY,
+    txid TEXT NOT NULL,
+    vout INTEGER NOT NULL,
+    cid TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class TxIndex:
+    """Persistent txid -> parsed AuthTx index.
+
+    Transactions never change once seen, so each one is fetched and parsed
+    at most once. Invalid (non-auth) transactions are recorded too so they
+    aren't fetched again.
+
+    It also maps each xid we manage to its current auth UTXO and cid. The
+    map is held in memory and written through to disk so it survives a
+    restart.
+    """
+
+    def __init__(self):
+        self.db = openStore('txindex.db', SCHEMA)
+        self.lock = Lock()
+
+        rows = self.db.execute('SELECT * FROM xids').fetchall()
+        self.xids = {row['xid']: dict(row) for row in rows}
+        self.updated = {}
+
+    def get(self, txid):
+        with self.lock:
+            return self.db.execute('SELECT * FROM authtx WHERE txid = ?', (txid,)).fetchone()
+
+    def put(self, txid, auth):
+        row = (txid, int(auth.isValid), auth.cid, auth.xid, getattr(auth, 'xid58', None), getattr(auth, 'op_return', None))
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO authtx VALUES (?, ?, ?, ?, ?, ?)', row)
+
+    def getLastBlock(self):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM sync WHERE name = 'lastblock'").fetchone()
+        return row['value'] if row else None
+
+    def setLastBlock(self, blockhash):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO sync VALUES ('lastblock', ?)", (blockhash,))
+
+    def getMany(self, txids):
+        """Index rows for txids, keyed by txid, looked up a chunk at a time."""
+        txids = list(txids)
+        rows = {}
+
+        with self.lock:
+            for i in range(0, len(txids), 500):
+                chunk = txids[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                for row in self.db.execute(f'SELECT * FROM authtx WHERE txid IN ({marks})', chunk):
+                    rows[row['txid']] = row
+
+        return rows
+
+    def getXid(self, xid):
+        with self.lock:
+            return self.xids.get(xid)
+
+    def setXid(self, xid, txid, vout, cid):
+        entry = {'xid': xid, 'txid': txid, 'vout': vout, 'cid': cid}
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO xids VALUES (?, ?, ?, ?)', (xid, txid, vout, cid))
+            self.xids[xid] = entry
+            self.updated[xid] = time.time()
+
+    def replaceXids(self, entries, since):
+        """Replace the whole map with a wallet snapshot taken at time since.
+
+        Entries set after the snapshot was taken are newer than it and kept.
+        Only the entries that differ are written.
+        """
+        xids = {entry['xid']: entry for entry in entries}
+
+        with self.lock, self.db:
+            for xid, updated in list(self.updated.items()):
+                if updated >= since:
+                    xids[xid] = self.xids[xid]
+                else:
+                    del self.updated[xid]
+
+            removed = [(xid,) for xid in self.xids if xid not in xids]
+            changed = [entry for xid, entry in xids.items() if self.xids.get(xid) != entry]
+
+            self.db.executemany('DELETE FROM xids WHERE xid = ?', removed)
+            self.db.executemany('INSERT OR REPLACE INTO xids VALUES (:xid, :txid, :vout, :cid)', changed)
+            self.xids = xids
+
+    def missing(self, txids):
+        """The txids that aren't indexed yet, looked up a chunk at a time."""
+        txids = list(txids)
+        known = set()
+
+        with self.lock:
+            for i in range(0, len(txids), 500):
+                chunk = txids[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                known.update(row['txid'] for row in self.db.execute(f'SELECT txid FROM authtx WHERE txid IN ({marks})', chunk))
+
+        return [txid for txid in txids if txid not in known]
+
+txindex = TxIndex()
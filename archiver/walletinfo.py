@@ -0,0 +1,96 @@
+import os
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Thread
+
+import authorizer
+import pricing
+
+def timed(name, fn, *args):
+    start = time.time()
+    result = fn(*args)
+    elapsed = time.time() - start
+    print(f"> {name} took {elapsed} seconds")
+    return result
+
+class WalletInfo:
+    """Cached snapshot for /api/v1/walletinfo.
+
+    Its sources are independent, so they are fetched at the same time and
+    a refresh costs about as much as the slowest one. A snapshot younger
+    than WALLETINFO_TTL seconds is served as is. For WALLETINFO_GRACE seconds
+    after that it is still served while a background refresh runs. Callers
+    that arrive during a refresh share it instead of starting their own.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('WALLETINFO_TTL', 10))
+        self.grace = int(os.environ.get('WALLETINFO_GRACE', 60))
+        self.executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix='walletinfo')
+        self.info = None
+        self.fetched = None
+        self.inflight = None
+        self.lock = Lock()
+
+    def get(self):
+        with self.lock:
+            age = time.time() - self.fetched if self.fetched else None
+
+            if age is not None and age < self.ttl:
+                return self.info
+
+            refresh = self.refresh()
+
+            if age is not None and age < self.ttl + self.grace:
+                return self.info
+
+        return refresh.result()
+
+    def refresh(self):
+        # Called with the lock held; joins the refresh in flight if there is one
+        if not self.inflight:
+            self.inflight = Future()
+            Thread(target=self.run, args=(self.inflight,), daemon=True).start()
+        return self.inflight
+
+    def run(self, future):
+        try:
+            info = self.build()
+            with self.lock:
+                self.info = info
+                self.fetched = time.time()
+            future.set_result(info)
+        except Exception as e:
+            print(f"walletinfo refresh failed: {str(e)}")
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.inflight = None
+
+    def build(self):
+        auth = authorizer.getAuthorizer()
+
+        wallet = self.executor.submit(timed, 'ensureWallet', auth.ensureWallet)
+        walletinfo = self.executor.submit(timed, 'getWalletinfo', auth.getWalletinfo)
+        rate = self.executor.submit(timed, 'getFee', auth.getFee, 3)
+        address = self.executor.submit(timed, 'getAddress', auth.getAddress)
+        btc_usd_rate = self.executor.submit(timed, 'exchange rates', pricing.rates.get)
+
+        wallet.result()
+        rate = rate.result()
+        fee = rate * 255/1000
+        fee_usd = fee * btc_usd_rate.result()
+
+        return {
+            "wallet": walletinfo.result(),
+            "rate": "{:.2f}".format(rate * 100000),
+            "fee": "{:.8f}".format(fee),
+            "fee_usd": "{:.2f}".format(fee_usd),
+            "staked": auth.staked,
+            "balance": auth.balance,
+            "notarizations": auth.balance//fee,
+            "address": address.result()
+        }
+
+walletInfo = WalletInfo()
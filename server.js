@@ -619,7 +619,7 @@ app.patch('/api/v1/asset/:xid', ensureAuthenticated, async (req, res) => {
         }
 
         asset.saveAsset(assetData);
-        await archiver.commitChanges({ type: 'update', agent: userId, asset: assetData.xid });
+        await archiver.commitChanges({ type: 'update', agent: userId, asset: assetData.xid }, [path.join(config.assets, assetData.xid)]);
 
         res.json({ message: 'Asset saved successfully' });
     } catch (error) {
@@ -960,7 +960,7 @@ app.patch('/api/v1/profile/', ensureAuthenticated, async (req, res) => {
         }
 
         agent.saveAgent(agentData);
-        await archiver.commitChanges({ type: 'update', agent: userId });
+        await archiver.commitChanges({ type: 'update', agent: userId }, [path.join(config.agents, userId)]);
         res.json({ message: 'Metadata updated successfully' });
     } catch (error) {
         console.error('Error updating metadata:', error);
@@ -1240,7 +1240,7 @@ app.patch('/api/v1/collections/:xid', ensureAuthenticated, async (req, res) => {
         }
 
         xidb.saveCollection(currentCollection);
-        await archiver.commitChanges({ type: 'update', agent: userId, asset: collection.xid });
+        await archiver.commitChanges({ type: 'update', agent: userId, asset: collection.xid }, [path.join(config.agents, userId), path.join(config.assets, collection.xid)]);
         res.json({ message: 'Collection updated successfully' });
     } catch (error) {
         console.error('Error processing request:', error);
@@ -1262,7 +1262,7 @@ app.delete('/api/v1/collections/:xid', ensureAuthenticated, async (req, res) =>
         }
 
         xidb.removeCollection(collection);
-        await archiver.commitChanges({ type: 'delete', agent: userId, asset: collection.xid });
+        await archiver.commitChanges({ type: 'delete', agent: userId, asset: collection.xid }, [path.join(config.agents, userId), path.join(config.assets, collection.xid)]);
         res.json({ message: 'Collection removed successfully' });
     } catch (error) {
         console.error('Error processing request:', error);
@@ -1387,10 +1387,22 @@ cron.schedule('* * * * *', async () => {
     }
 });
 
+// The cron and the watcher below share one certify check at a time, so the
+// same pending txn is never certified (and committed) twice
+let certifying = null;
+
+function checkPendingCert() {
+    if (!certifying) {
+        certifying = admin.certifyCheck().finally(() => { certifying = null; });
+    }
+
+    return certifying;
+}
+
 // Check pending txn every minute
 cron.schedule('* * * * *', async () => {
     try {
-        const response = await admin.certifyCheck();
+        const response = await checkPendingCert();
         console.log(`certify check: ${response.message}`);
     }
     catch (error) {
@@ -1398,6 +1410,34 @@ cron.schedule('* * * * *', async () => {
     }
 });
 
+// Certify the pending txn as soon as the archiver sees its block; the cron above is the fallback
+async function watchPendingCert() {
+    while (true) {
+        try {
+            const adminData = admin.getAdmin();
+
+            if (adminData.pending) {
+                const result = await archiver.waitForCert(adminData.pending, 30);
+
+                if (result?.status === 'certified') {
+                    const response = await checkPendingCert();
+                    console.log(`certify check: ${response.message}`);
+
+                    // If certifying failed, /certify/wait answers at once again, so back off below
+                    if (response.message === 'Certified!') {
+                        continue;
+                    }
+                }
+            }
+        }
+        catch (error) {
+            console.error(`Error watching pending txn: ${error}`);
+        }
+
+        await new Promise(resolve => setTimeout(resolve, 5000));
+    }
+}
+
 // Check hourly whether to notarize
 cron.schedule('*/10 * * * *', async () => {
     try {
@@ -1429,6 +1469,8 @@ xidb.integrityCheck().then(async () => {
         console.log(`ArtX server running on ${config.host}:${config.port}`);
         console.log(`config: ${JSON.stringify(config, null, 4)}`);
     });
+
+    watchPendingCert();
 }).catch((error) => {
     console.error('Failed to start the server:', error);
 });
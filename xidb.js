@@ -54,9 +54,10 @@ async function integrityCheck() {
     await waitForLightning();
 
     const assets = allAssets();
+    const pins = await archiver.pinAssets(assets.filter(xid => asset.getAsset(xid)?.token?.url)) || {};
 
     for (const [i, xid] of assets.entries()) {
-        const res = await repairAsset(xid);
+        const res = await repairAsset(xid, pins[xid]);
         const index = (i + 1).toString().padStart(5, " ");
 
         if (res.fixed) {
@@ -134,7 +135,7 @@ function allAgents(config = realConfig) {
     return agents;
 }
 
-async function repairAsset(xid) {
+async function repairAsset(xid, pinned) {
 
     const removeInvalidAsset = (xid) => {
         asset.removeAsset(xid);
@@ -169,9 +170,9 @@ async function repairAsset(xid) {
     }
 
     if (assetData.token?.url) {
-        const ipfs = await archiver.pinAsset(xid);
+        const ipfs = pinned || await archiver.pinAsset(xid);
 
-        if (ipfs.cids) {
+        if (ipfs?.cids) {
             for (const pin of ipfs.cids) {
                 if (pin.name.includes(assetData.file.fileName)) {
                     assetData.token.cid = pin.cid;